@@ -0,0 +1,208 @@
+"""Benchmarks of the numerical kernels of iq.tools and iq.finance.
+
+The benchmarks run offline on generated data. They sweep the number of assets,
+the length of the price history, the ratio of missing data and the cost
+function, and report the wall time and the peak memory of every case.
+
+Usage:
+
+    python benchmarks/benchmark_kernels.py --save baseline.json
+    python benchmarks/benchmark_kernels.py --baseline baseline.json --threshold 0.2
+
+The second run fails, with exit code 1, if any case is slower or uses more
+memory than the baseline by more than the threshold ratio.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import iq.api.iqrestapi
+import iq.finance.index_tracking
+import iq.tools.quadratic_utility
+
+
+DEFAULT_NUM_ASSETS = [100, 256, 512, 1024, 2048]
+DEFAULT_NUM_DATES = [252, 504]
+DEFAULT_MISSING_DATA_RATIOS = [0.0, 0.1]
+DEFAULT_COST_FUNCTIONS = ["covariance", "quadratic_distance"]
+DEFAULT_ENGINES = ["einsum", "blas"]
+
+
+def generate_prices(num_dates, num_assets, missing_data_ratio, rng_seed=0):
+    """Random walk prices of num_assets assets plus a benchmark, the last
+    column. A fraction of the assets are listed late and a few prices are
+    missing at random, so that about missing_data_ratio of the prices of
+    those assets are missing."""
+    rng = np.random.default_rng(rng_seed)
+    returns = 0.01 * rng.standard_normal((num_dates, num_assets + 1))
+    np_prices = 100 * np.exp(np.cumsum(returns, axis=0))
+    if missing_data_ratio > 0:
+        num_late_assets = max(1, num_assets // 10)
+        ix_late_assets = rng.choice(num_assets, num_late_assets, replace=False)
+        np_prices[:int(missing_data_ratio * num_dates), ix_late_assets] = np.nan
+        b_missing = rng.random((num_dates, num_assets)) < missing_data_ratio / 10
+        np_prices[:, :num_assets][b_missing] = np.nan
+    dates = np.datetime64("2000-01-03") + np.arange(num_dates)
+    tickers = [f"ASSET{i}" for i in range(num_assets)] + ["BENCHMARK"]
+    return dates, np_prices, tickers
+
+
+def generate_sectors(tickers, num_sectors, rng_seed=0):
+    rng = np.random.default_rng(rng_seed)
+    sectors = [f"SECTOR{i}" for i in range(num_sectors)]
+    sectorial_distribution = {ticker: sectors[rng.integers(num_sectors)] for ticker in tickers}
+    sectorial_weights = {sector: 1 / num_sectors for sector in sectors}
+    return sectorial_weights, sectorial_distribution
+
+
+def measure(function, num_repetitions):
+    """Minimum wall time over num_repetitions calls and peak memory allocated
+    during one call."""
+    wall_times = []
+    for _ in range(num_repetitions):
+        start = time.perf_counter()
+        function()
+        wall_times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"wall_time": min(wall_times), "peak_memory": peak_memory}
+
+
+def benchmark_cases(args):
+    """Yield the name and the function of every case of the sweep."""
+    for num_assets in args.num_assets:
+        for num_dates in args.num_dates:
+            for missing_data_ratio in args.missing_data_ratios:
+                prices = generate_prices(num_dates, num_assets, missing_data_ratio)
+                returns = 100 * (prices[1][1:] / prices[1][:-1] - 1)
+                suffix = f"assets={num_assets},dates={num_dates},missing={missing_data_ratio}"
+
+                for engine in args.engines:
+                    yield (
+                        f"compute_EWMA_cost_function[engine={engine},{suffix}]",
+                        lambda returns=returns, engine=engine: iq.tools.quadratic_utility.compute_EWMA_cost_function(
+                            returns, 252, b_remove_mean=True, engine=engine
+                        )
+                    )
+
+                for str_cost_function in args.cost_functions:
+                    yield (
+                        f"compute_quadratic_utility[cost={str_cost_function},{suffix}]",
+                        lambda prices=prices, str_cost_function=str_cost_function: iq.tools.quadratic_utility.compute_quadratic_utility(
+                            prices, "BENCHMARK", str_cost_function, None, None,
+                            EMWA_halflife=252,
+                            maximum_missing_data_ratio_allowed=1.0,
+                            engine=args.engines[-1]
+                        )
+                    )
+
+        _, _, tickers = generate_prices(2, num_assets, 0.0)
+        asset_names = np.array(tickers[:-1])
+        sectorial_weights, sectorial_distribution = generate_sectors(asset_names, 11)
+        yield (
+            f"build_matrix_of_sector_restrictions[assets={num_assets},sectors=11]",
+            lambda asset_names=asset_names, sectorial_weights=sectorial_weights, sectorial_distribution=sectorial_distribution:
+                iq.finance.index_tracking.build_matrix_of_sector_restrictions(
+                    asset_names, sectorial_weights, sectorial_distribution, 0.05
+                )
+        )
+
+        cost_matrix, benchmark_cost_vector, tickers = iq.tools.quadratic_utility.compute_quadratic_utility(
+            generate_prices(args.num_dates[-1], num_assets, 0.0), "BENCHMARK", "covariance", None, None,
+            engine="blas"
+        )
+        yield (
+            f"solve_index_tracking_validation[assets={num_assets}]",
+            lambda cost_matrix=cost_matrix, benchmark_cost_vector=benchmark_cost_vector, tickers=tickers:
+                iq.finance.index_tracking.solve_index_tracking(
+                    cost_matrix, benchmark_cost_vector, min(30, len(tickers) - 1), tickers,
+                    feasibility_check="none"
+                )
+        )
+
+
+def _offline_post(*args, **kwdargs):
+    """Replacement of iqrestapi.post, so that solve_index_tracking only runs its
+    local validation and serialization."""
+    return {"named_solution": {}, "status": "Ok"}
+
+
+def compare(results, baseline, threshold):
+    """Names and descriptions of the cases that regressed with respect to the
+    baseline by more than the threshold ratio."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric in ["wall_time", "peak_memory"]:
+            reference = baseline[name][metric]
+            if reference > 0 and result[metric] > reference * (1 + threshold):
+                regressions.append(
+                    f"{name}: {metric} {result[metric]:.4g} > {reference:.4g} * (1 + {threshold})"
+                )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--num-assets", type=int, nargs="+", default=DEFAULT_NUM_ASSETS)
+    parser.add_argument("--num-dates", type=int, nargs="+", default=DEFAULT_NUM_DATES)
+    parser.add_argument("--missing-data-ratios", type=float, nargs="+", default=DEFAULT_MISSING_DATA_RATIOS)
+    parser.add_argument("--cost-functions", nargs="+", default=DEFAULT_COST_FUNCTIONS)
+    parser.add_argument("--engines", nargs="+", default=DEFAULT_ENGINES)
+    parser.add_argument("--repetitions", type=int, default=3, help="Number of timed calls of each case.")
+    parser.add_argument("--filter", default="", help="Only run the cases whose name contains this string.")
+    parser.add_argument("--save", help="Store the results as a JSON baseline in this file.")
+    parser.add_argument("--baseline", help="Compare the results with the JSON baseline in this file.")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed relative regression.")
+    args = parser.parse_args(argv)
+
+    iq.api.iqrestapi.post = _offline_post
+
+    results = {}
+    for name, function in benchmark_cases(args):
+        if args.filter not in name:
+            continue
+        results[name] = measure(function, args.repetitions)
+        print(
+            f"{name}: {1000 * results[name]['wall_time']:.2f} ms, "
+            f"{results[name]['peak_memory'] / 2**20:.2f} MiB", flush=True
+        )
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(
+                {
+                    "metadata": {
+                        "python": sys.version,
+                        "numpy": np.__version__,
+                        "platform": platform.platform(),
+                    },
+                    "results": results,
+                },
+                file, indent=2
+            )
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""Asyncio counterpart of `iq.api.iqrestapi`.
+
+Requests are awaited without blocking the event loop, so that one process can
+track thousands of pending computations with a single thread. All the
+coroutines of an `AsyncClient` share its connection pool, and cancelling the
+task that awaits a computation stops waiting for it. The module level
+coroutines open and close a client for every call; use an `AsyncClient` to
+share the connections between calls.
+
+It requires aiohttp, e.g. `pip install iq-index-tracking[async]`. The
+credentials, base URL and settings are the ones of an `iqrestapi.IQClient`.
+"""
+import asyncio
+import itertools
+import time
+
+from iq.api import iqrestapi
+
+
+class AsyncClient:
+    """Asynchronous client of the Inspiration-Q API with a shared connection pool.
+
+    Use it as an async context manager, or close it with `await client.close()`:
+
+        async with AsyncClient() as client:
+            results = await asyncio.gather(*[client.post(function, json=payload) for payload in payloads])
+
+    Parameters
+    ----------
+    max_connections : int, default=100
+        Maximum number of simultaneous connections of the pool.
+    client : iq.api.iqrestapi.IQClient, optional, default=None
+        Client with the credentials, base URL and settings to use. Defaults to
+        `iqrestapi.get_default_client()`.
+
+    """
+
+    def __init__(self, max_connections=100, client=None):
+        self.max_connections = max_connections
+        self.client = iqrestapi.get_default_client() if client is None else client
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            import aiohttp
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections)
+            )
+        return self._session
+
+    def _headers(self):
+        return iqrestapi._headers(self.client.auth)
+
+    async def post(self, function, waittime=None, max_waiting_time=None, polling_policy=None, **arguments):
+        """Same as `iqrestapi.IQClient.post`: create a computation and wait for
+        its result."""
+        start_time = time.monotonic()
+        body, retry_after = await self._submit(function, **arguments)
+        if not body.get("status", False):
+            return body
+        return await self._wait(function, body, retry_after, waittime, max_waiting_time, polling_policy, start_time)
+
+    async def submit(self, function, **arguments):
+        """Same as `iqrestapi.submit`: create a computation without waiting for it."""
+        return (await self._submit(function, **arguments))[0]
+
+    async def get_computation(self, function, computation_id):
+        """Same as `iqrestapi.get_computation`: current state of a computation."""
+        return (await self._get_computation(function, computation_id))[0]
+
+    async def wait(self, function, computation_id, waittime=None, max_waiting_time=None, polling_policy=None):
+        """Poll a computation until it finishes, see `iqrestapi.IQClient.post`."""
+        return await self._wait(
+            function, {"computationId": computation_id}, None, waittime, max_waiting_time, polling_policy, time.monotonic()
+        )
+
+    async def _submit(self, function, **arguments):
+        if function not in self.client.url_dict:
+            raise Exception(f"Unknown API function {function}")
+        url = self.client.url_dict[function]
+
+        headers = self._headers()
+        if "json" in arguments:
+            # The JSON is encoded and compressed in a worker thread, one chunk
+            # at a time, so that large payloads do not block the event loop.
+            data, content_headers = await asyncio.to_thread(
+                iqrestapi._json_body, arguments.pop("json"),
+                self.client.setting("compression_threshold"), self.client.setting("compression_level")
+            )
+            arguments["data"] = data if isinstance(data, bytes) else _iterate_in_thread(data)
+            headers = headers | content_headers
+        debug = self.client.setting("debug")
+        if debug:
+            iqrestapi._print_call("POST", url, headers, arguments, debug)
+
+        async with self._get_session().post(url, headers=headers, **arguments) as r:
+            if not r.ok:
+                raise Exception(f"Error returned from Inspiration-Q API. function: {function}. response: {r.status} {r.reason}")
+            r_json = await r.json(content_type=None)
+            retry_after = iqrestapi._retry_after(r.headers)
+        if 'exception' in r_json:
+            raise Exception(r_json['exception'])
+        return r_json, retry_after
+
+    async def _get_computation(self, function, computation_id, deadline=None):
+        import aiohttp
+
+        # Retried like the GET requests of the client, see `iqrestapi.max_retries`.
+        url = iqrestapi._computation_url(self.client.base_url, function, computation_id)
+        debug = self.client.setting("debug")
+        max_retries = self.client.setting("max_retries")
+        for retry in itertools.count():
+            if debug:
+                iqrestapi._print_call("GET", url, self._headers(), {}, debug)
+            try:
+                async with self._get_session().get(url, headers=self._headers()) as r:
+                    if r.ok:
+                        return await r.json(content_type=None), iqrestapi._retry_after(r.headers)
+                    if r.status not in self.client.setting("retry_status_codes") or retry >= max_retries:
+                        raise Exception(f"Error returned from Inspiration-Q API: {r.status} {r.reason}")
+                    retry_after = iqrestapi._retry_after(r.headers)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as error:
+                if retry >= max_retries:
+                    raise
+                if debug:
+                    print(f"Retrying GET request after error {error!r}")
+                retry_after = None
+            await asyncio.sleep(self.client._retry_waiting_time(
+                self.client._backoff_time(retry) if retry_after is None else retry_after, deadline
+            ))
+
+    async def _wait(self, function, body, retry_after, waittime, max_waiting_time, polling_policy, start_time):
+        max_waiting_time = self.client.setting("API_timeout") if max_waiting_time is None else max_waiting_time
+        polling_policy = self.client.setting("polling_policy") if polling_policy is None else polling_policy
+        computation_id = body["computationId"]
+        schedule = polling_policy.schedule(body, retry_after, waittime)
+        while True:
+            remaining_time = start_time + max_waiting_time - time.monotonic()
+            if remaining_time <= 0:
+                raise Exception(f"Exceeded maximum time to complete computation with method '{function}'. Maximum time: {max_waiting_time / 3600:2.1f}h")
+            await asyncio.sleep(min(schedule.interval, remaining_time))
+            body, retry_after = await self._get_computation(function, computation_id, start_time + max_waiting_time)
+            if iqrestapi.is_finished(body):
+                return body
+            schedule.update(body, retry_after)
+
+
+async def _iterate_in_thread(chunks):
+    """Asynchronous iterator over a synchronous one that computes every
+    element in a worker thread."""
+    end = object()
+    while True:
+        chunk = await asyncio.to_thread(next, chunks, end)
+        if chunk is end:
+            return
+        yield chunk
+
+
+async def post(function, waittime=None, **arguments):
+    async with AsyncClient() as client:
+        return await client.post(function, waittime, **arguments)
+
+
+async def submit(function, **arguments):
+    async with AsyncClient() as client:
+        return await client.submit(function, **arguments)
+
+
+async def get_computation(function, computation_id):
+    async with AsyncClient() as client:
+        return await client.get_computation(function, computation_id)
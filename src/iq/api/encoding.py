@@ -0,0 +1,94 @@
+import base64
+
+import numpy as np
+
+
+# Layouts of the binary encoded arrays.
+DENSE = "dense"
+UPPER_TRIANGLE = "upper_triangle"
+
+
+def encode_array(A, b_symmetric=False, dtype="<f8"):
+    """Encode an array as a JSON object with its raw bytes in base64.
+
+    Parameters
+    ----------
+    A : array_like
+        Array to encode.
+    b_symmetric : bool, default=False
+        If True, A must be a symmetric matrix and only its upper triangle,
+        including the diagonal, is encoded, row by row. This halves the size of
+        the payload.
+    dtype : str, default="<f8"
+        Little endian dtype of the encoded elements.
+
+    Returns
+    -------
+    encoded_A : dict
+        {"encoding": "base64", "layout": "dense" | "upper_triangle",
+        "dtype": dtype, "shape": list(A.shape), "data": str}
+
+    """
+    A = np.asarray(A)
+    if b_symmetric:
+        if A.ndim != 2 or A.shape[0] != A.shape[1]:
+            raise ValueError(f"Only square matrices can be encoded as an upper triangle. Got an array with shape {A.shape}.")
+        data = A[np.triu_indices(A.shape[0])]
+        layout = UPPER_TRIANGLE
+    else:
+        data = A.ravel()
+        layout = DENSE
+    data = np.ascontiguousarray(data, dtype=np.dtype(dtype))
+    return {
+        "encoding": "base64",
+        "layout": layout,
+        "dtype": data.dtype.str,
+        "shape": list(A.shape),
+        "data": base64.b64encode(data.view(np.uint8)).decode("ascii"),
+    }
+
+
+def decode_array(encoded_A):
+    """Reference decoder of `encode_array`. Plain JSON arrays, i.e. nested
+    lists, are also accepted, so that it decodes any of the wire formats.
+
+    Parameters
+    ----------
+    encoded_A : dict or list
+
+    Returns
+    -------
+    A : np.ndarray
+
+    """
+    if not isinstance(encoded_A, dict):
+        return np.asarray(encoded_A)
+
+    if encoded_A.get("encoding") != "base64":
+        raise ValueError(f"Encoding '{encoded_A.get('encoding')}' is not valid. The only possible value is 'base64'.")
+    shape = tuple(encoded_A["shape"])
+    data = np.frombuffer(base64.b64decode(encoded_A["data"]), dtype=np.dtype(encoded_A["dtype"]))
+
+    layout = encoded_A.get("layout", DENSE)
+    if layout == DENSE:
+        if data.size != np.prod(shape, dtype=int):
+            raise ValueError(f"The encoded data has {data.size} elements, which do not fit in shape {shape}.")
+        return data.reshape(shape).copy()
+    if layout == UPPER_TRIANGLE:
+        if len(shape) != 2 or shape[0] != shape[1] or data.size != shape[0] * (shape[0] + 1) // 2:
+            raise ValueError(f"The encoded data has {data.size} elements, which do not fit in the upper triangle of shape {shape}.")
+        A = np.empty(shape, dtype=data.dtype)
+        I, J = np.triu_indices(shape[0])
+        A[I, J] = data
+        A[J, I] = data
+        return A
+    raise ValueError(f"Layout '{layout}' is not valid. Possible values are '{DENSE}' or '{UPPER_TRIANGLE}'.")
+
+
+def decode_payload(json_args):
+    """Copy of a request payload with the arrays encoded by `encode_array`
+    decoded, e.g. to check offline what the server receives."""
+    return {
+        key: decode_array(value) if isinstance(value, dict) and "encoding" in value else value
+        for key, value in json_args.items()
+    }
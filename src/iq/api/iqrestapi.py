@@ -1,8 +1,42 @@
 
+import datetime
+import email.utils
+import itertools
+import json
+import random
 import requests
+import requests.adapters
+import threading
 import time
+import zlib
+
+from iq.api.journal import ComputationJournal, hash_credentials, hash_payload
 
 debug = False
+# Request bodies larger than this number of bytes are streamed compressed with
+# gzip, e.g. compression_threshold = 1 << 20, for servers that accept
+# "Content-Encoding: gzip" requests. None, the default, sends them as they are.
+compression_threshold = None
+compression_level = 6
+_compression_chunk_size = 1 << 16
+# Maximum time to wait for a computation, in seconds. The time between polls is
+# set by polling_policy, a PollingPolicy.
+API_timeout = 12 * 3600
+# Connections kept alive in the pool of the shared session, per host.
+pool_size = 10
+# Retries of the idempotent GET requests after a connection error, a timeout or
+# one of the retry_status_codes, with jittered exponential backoff: the n-th
+# retry waits a random time between 0 and min(retry_backoff * 2**n,
+# retry_backoff_max) seconds, or the Retry-After time of the response, up to
+# retry_backoff_max seconds. The retries stop when the computation times out.
+max_retries = 5
+retry_backoff = 0.5
+retry_backoff_max = 30
+retry_status_codes = {429, 500, 502, 503, 504}
+# ComputationJournal where the computations are recorded, so that they can be
+# resumed after a restart, or None.
+journal = None
+_valid_solution_identifiers = ["solution", "named_solution", "zscore"]
 _base_url="https://www.inspiration-q.com/api/"
 _url_dict = {}
 _auth = {}
@@ -28,109 +62,634 @@ def set_auth(auth):
     _auth = auth
 
 
-def post(*args, **kwdargs):
-    r_json = _post(_base_url, _url_dict, _auth, *args, **kwdargs)
-    if 'exception' in r_json:
-        raise Exception(r_json['exception'])
-    return r_json
-
-
-def _get(url, headers, **arguments):
-    if debug:
-        _print_call("GET", url, headers, arguments)
-    r = requests.get(url=url, headers=headers, **arguments)
-    if debug:
-        print(f"Received request Response {r} with content:\n{r.content}")
-    if not r.ok:
-        raise Exception(f"Error returned from Inspiration-Q API: {r}")
-    return r.json()
-
-
-def _post(base_url, url_dict, auth, function, waittime=1, **arguments):
-    headers = auth
-
-    if function not in url_dict:
-        error_msg = f"Unknown API function {function}"
-        print(url_dict)
-        raise Exception(error_msg)
-
-    url = url_dict[function]
-    if debug:
-        _print_call("POST", url, headers, arguments)
-    r = requests.post(url=url, headers=headers, **arguments)
-    if debug:
-        print(f"Received request Response {r} with content:\n{r.content}")
-    if not r.ok:
-        error = f"Error returned from Inspiration-Q API. function: {function}. response: {r}"
-        if debug:
-            print(error)
-        raise Exception(error)
+def get_default_client():
+    """Client used by the module level functions. Its credentials, base URL and
+    settings are the ones of the module, e.g. `initialize_credentials` or
+    `iqrestapi.debug = True`."""
+    return _default_client
+
+
+def get_session():
+    """Session shared by the requests of the default client."""
+    return _default_client.get_session()
 
-    body = r.json()
 
-    if not body.get("status", False):
-        return body
+def reset_session():
+    """Close the session of the default client. The next request opens a new
+    one, e.g. to apply a new pool_size."""
+    _default_client.reset_session()
 
-    # response has this format
-    # {"computationId":"9970243c-44f7-4150-ab81-29c725feeabf","status":"Pending","computationStoreTime":"2024-03-14T17:06:15.452113+00:00"}
-    # we need to do a GET to function/{computationId} to retrieve the actual response once calc finishes
 
-    url = base_url + "/" + function + "/" + body["computationId"]
+def post(*args, **kwdargs):
+    """Create a computation and wait for its result, see `IQClient.post`."""
+    return _default_client.post(*args, **kwdargs)
+
+
+def submit(function, **arguments):
+    """Create a computation without waiting for it to finish.
+
+    Returns the first response of the API. If it has a "status", the
+    computation runs asynchronously and its result is retrieved with
+    `get_computation(function, response["computationId"])` until
+    `is_finished(response)`.
+    """
+    return _default_client.submit(function, **arguments)
+
+
+def get_computation(function, computation_id):
+    """Current state of a computation created by `submit`."""
+    return _default_client.get_computation(function, computation_id)
+
+
+def resume(function=None, max_waiting_time=None, polling_policy=None):
+    """Wait for the outstanding computations of the journal, see `IQClient.resume`."""
+    return _default_client.resume(function, max_waiting_time, polling_policy)
+
+
+def is_finished(body):
+    """Whether a response of the API has the solution or has failed."""
+    if any(body.get(solution_identifier) for solution_identifier in _valid_solution_identifiers):
+        return True
+    return body.get("status") == "Failed"
+
+
+class RateLimiter:
+    """Token bucket that allows max_requests_per_second requests on average,
+    with bursts of up to burst requests. It can be shared between threads.
+
+    Parameters
+    ----------
+    max_requests_per_second : float
+    burst : int, default=1
+
+    """
+
+    def __init__(self, max_requests_per_second, burst=1):
+        if max_requests_per_second <= 0:
+            raise ValueError(f"The maximum number of requests per second must be positive. Got {max_requests_per_second}.")
+        self.max_requests_per_second = max_requests_per_second
+        self.burst = burst
+        self._tokens = burst
+        self._last_time = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Wait until a request is allowed."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last_time) * self.max_requests_per_second)
+            self._last_time = now
+            # The token is reserved even if it is not available yet, so that
+            # the waiting threads are served in order.
+            self._tokens -= 1
+            waiting_time = -self._tokens / self.max_requests_per_second if self._tokens < 0 else 0.0
+        if waiting_time > 0:
+            time.sleep(waiting_time)
+
+
+class PollingPolicy:
+    """Time between the polls of a computation.
+
+    The polls are spaced in proportion to the time that the computation has
+    been in its current state, e.g. "Pending" in the queue or "Computing", so
+    that quick computations are polled often and long ones less often. The
+    intervals grow geometrically, by a factor of 1 + elapsed_fraction, until
+    they reach max_interval, after max_interval / elapsed_fraction seconds,
+    and from then on there is one poll per max_interval: with the defaults, a
+    computation of one minute is polled about 30 times and one of an hour
+    about 90 times. The result of a computation of duration T is retrieved at
+    most about min(elapsed_fraction * T, max_interval) late. The elapsed time
+    is measured from the computationStoreTime of the API, if it is known, and
+    from the last change of status. A Retry-After header of the API takes
+    precedence.
+
+    Parameters
+    ----------
+    initial_interval : float, default=0.25
+        Time before the first poll, in seconds.
+    min_interval : float, default=0.25
+        Minimum time between polls, in seconds.
+    max_interval : float, default=60
+        Maximum time between polls, in seconds.
+    elapsed_fraction : float, default=0.2
+        Time between polls as a fraction of the time in the current status.
+    b_honor_retry_after : bool, default=True
+        If True, wait the time in the Retry-After header of the responses
+        instead, when there is one.
+
+    """
+
+    def __init__(self, initial_interval=0.25, min_interval=0.25, max_interval=60, elapsed_fraction=0.2, b_honor_retry_after=True):
+        if not 0 < min_interval <= max_interval:
+            raise ValueError(f"The intervals must satisfy 0 < min_interval <= max_interval. Got min_interval={min_interval} and max_interval={max_interval}.")
+        self.initial_interval = initial_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.elapsed_fraction = elapsed_fraction
+        self.b_honor_retry_after = b_honor_retry_after
+
+    def schedule(self, body, retry_after=None, initial_interval=None):
+        """Schedule of the polls of the computation created with response body."""
+        return _PollingSchedule(self, body, retry_after, initial_interval)
+
+
+class _PollingSchedule:
+    """State of the polls of one computation. `interval` is the time until the
+    next poll, which is updated by `update` with every response."""
+
+    def __init__(self, policy, body, retry_after, initial_interval):
+        self.policy = policy
+        self.status = body.get("status")
+        self.status_time = time.monotonic() - _age(body.get("computationStoreTime"))
+        self.interval = self._hint(retry_after)
+        if self.interval is None:
+            self.interval = policy.initial_interval if initial_interval is None else initial_interval
+
+    def update(self, body, retry_after=None):
+        now = time.monotonic()
+        if body.get("status") != self.status:
+            # It changed at some time since the last poll, e.g. from "Pending"
+            # to "Computing" when the computation starts.
+            self.status = body.get("status")
+            self.status_time = now - self.interval / 2
+        self.interval = self._hint(retry_after)
+        if self.interval is None:
+            self.interval = min(
+                max(self.policy.elapsed_fraction * (now - self.status_time), self.policy.min_interval),
+                self.policy.max_interval
+            )
+        return self.interval
+
+    def _hint(self, retry_after):
+        if retry_after is not None and self.policy.b_honor_retry_after:
+            return retry_after
+        return None
+
+
+class IQClient:
+    """Client of the Inspiration-Q API with its own credentials, base URL,
+    connection pool and settings, so that several API keys or environments can
+    be used from concurrent threads of the same process.
+
+        client = IQClient("<your-api-key>")
+        body = client.post("v1/iq-finance/index-tracking", json=payload)
+
+    The module level functions, e.g. `iqrestapi.post`, use the default client,
+    `get_default_client()`.
+
+    Parameters
+    ----------
+    api_key : str, optional, default=None
+        Subscription key of the API. If None, the credentials of the module,
+        set with `initialize_credentials`, are used.
+    base_url : str, optional, default=None
+        Base URL of the API. If None, the one of the module is used.
+    **settings
+        Settings of this client, with the names of the module settings:
+        debug, compression_threshold, compression_level, API_timeout,
+        polling_policy, pool_size, max_retries, retry_backoff,
+        retry_backoff_max, retry_status_codes and journal. The settings that are not given take the current
+        value of the module setting, e.g. `iqrestapi.API_timeout`.
+
+    """
+
+    def __init__(self, api_key=None, base_url=None, **settings):
+        unknown_settings = set(settings) - set(_settings)
+        if unknown_settings:
+            raise ValueError(f"Unknown settings {sorted(unknown_settings)}. Possible settings are {_settings}.")
+        self._auth = None if api_key is None else _build_auth(api_key)
+        self._base_url = base_url
+        self._url_dict = None if base_url is None else _specialize(base_url, _known_entry_points)
+        self.settings = settings
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def auth(self):
+        return _auth if self._auth is None else self._auth
+
+    @property
+    def base_url(self):
+        return _base_url if self._base_url is None else self._base_url
+
+    @property
+    def url_dict(self):
+        return _url_dict if self._url_dict is None else self._url_dict
+
+    def setting(self, name):
+        """Value of a setting of this client, or of the module if it is not set."""
+        return self.settings[name] if name in self.settings else globals()[name]
+
+    def get_session(self):
+        """Session shared by all the requests of this client, so that the
+        connections to the API are pooled and kept alive instead of opening a
+        new connection, with its TLS handshake, for every request."""
+        with self._session_lock:
+            if self._session is None:
+                self._session = _build_session(self.setting("pool_size"))
+            return self._session
+
+    def reset_session(self):
+        """Close the session. The next request opens a new one."""
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+
+    def post(self, function, waittime=None, max_waiting_time=None, polling_policy=None, **arguments):
+        """Create a computation and wait for its result.
+
+        Parameters
+        ----------
+        function : str
+            Function of the API, e.g. "v1/iq-finance/index-tracking".
+        waittime : float, optional, default=None
+            Time before the first poll, in seconds. Defaults to the
+            initial_interval of the polling policy.
+        max_waiting_time : float, optional, default=None
+            Maximum time to wait for the result, in seconds. Defaults to the
+            API_timeout setting.
+        polling_policy : PollingPolicy, optional, default=None
+            Time between polls. Defaults to the polling_policy setting.
+        **arguments
+            Arguments of the request, e.g. json.
+
+        Returns
+        -------
+        body : dict
+            Response of the API with the result.
+
+        """
+        r_json = self._post(function, waittime, max_waiting_time, polling_policy, **arguments)
+        if 'exception' in r_json:
+            raise Exception(r_json['exception'])
+        return r_json
+
+    def submit(self, function, **arguments):
+        """Same as the module function `submit`, with this client."""
+        r_json, _ = self._submit(function, **arguments)
+        if 'exception' in r_json:
+            raise Exception(r_json['exception'])
+        return r_json
+
+    def get_computation(self, function, computation_id):
+        """Current state of a computation created by `submit`."""
+        return self._get_computation(function, computation_id)[0]
+
+    def wait(self, function, computation_id, waittime=None, max_waiting_time=None, polling_policy=None):
+        """Wait for the result of a computation created by `submit`, see `post`."""
+        return self._wait_or_fail(
+            function, {"computationId": computation_id}, None, waittime, max_waiting_time, polling_policy, time.monotonic()
+        )
+
+    def resume(self, function=None, max_waiting_time=None, polling_policy=None):
+        """Wait for the computations of the base URL and credentials of this
+        client that are outstanding in its journal, e.g. after a restart.
+
+        Parameters
+        ----------
+        function : str, optional, default=None
+            If given, only the computations of this function are resumed.
+        max_waiting_time : float, optional, default=None
+            Maximum time to wait for every computation, in seconds.
+        polling_policy : PollingPolicy, optional, default=None
+
+        Returns
+        -------
+        results : dict
+            Response of the API with the result of every computation, by
+            computationId. The computations that cannot be retrieved have
+            status "Failed", and stay outstanding in the journal so that they
+            can be resumed again.
+
+        """
+        journal = self.setting("journal")
+        if journal is None:
+            raise ValueError("There is no journal to resume the computations from. Set one, e.g. iqrestapi.journal = ComputationJournal(path).")
+        results = {}
+        for computation in journal.outstanding(self.base_url, function, hash_credentials(self.auth)):
+            computation_id = computation["computation_id"]
+            body = {
+                "computationId": computation_id,
+                "status": computation["status"],
+                "computationStoreTime": computation["computation_store_time"],
+            }
+            try:
+                # The first poll is immediate: it may have finished meanwhile.
+                results[computation_id] = self._wait(
+                    computation["function"], body, None, 0, max_waiting_time, polling_policy, time.monotonic()
+                )
+            except Exception as error:
+                results[computation_id] = body | {"status": "Failed", "error_description": "Resume: " + repr(error)}
+        return results
+
+    def _get(self, url, headers, deadline=None, **arguments):
+        """Response body and Retry-After time of a GET request. The retries
+        stop at deadline, a time.monotonic() time, if given."""
+        # GET requests are idempotent, so transient errors are retried instead
+        # of losing a computation that is running in the API.
+        debug = self.setting("debug")
+        max_retries = self.setting("max_retries")
+        for retry in itertools.count():
+            if debug:
+                _print_call("GET", url, headers, arguments, debug)
+            try:
+                r = self.get_session().get(url=url, headers=headers, **arguments)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                if retry >= max_retries:
+                    raise
+                if debug:
+                    print(f"Retrying GET request after error {error!r}")
+            else:
+                if debug:
+                    print(f"Received request Response {r} with content:\n{r.content}")
+                if r.ok:
+                    return r.json(), _retry_after(r.headers)
+                if r.status_code not in self.setting("retry_status_codes") or retry >= max_retries:
+                    raise requests.HTTPError(f"Error returned from Inspiration-Q API: {r}", response=r)
+                if debug:
+                    print(f"Retrying GET request after response {r}")
+                retry_after = _retry_after(r.headers)
+                if retry_after is not None:
+                    time.sleep(self._retry_waiting_time(retry_after, deadline))
+                    continue
+            time.sleep(self._retry_waiting_time(self._backoff_time(retry), deadline))
+
+    def _get_computation(self, function, computation_id):
+        """Current state of a computation and Retry-After time of the response."""
+        body, retry_after = self._get(_computation_url(self.base_url, function, computation_id), _headers(self.auth))
+        if is_finished(body):
+            self._finish(computation_id, body)
+        return body, retry_after
+
+    def _retry_waiting_time(self, waiting_time, deadline):
+        """Time to wait before a retry, at most retry_backoff_max and the time
+        left until deadline."""
+        waiting_time = min(waiting_time, self.setting("retry_backoff_max"))
+        if deadline is None:
+            return waiting_time
+        remaining_time = deadline - time.monotonic()
+        if remaining_time <= 0:
+            raise Exception("Exceeded maximum time to retry the request to the Inspiration-Q API.")
+        return min(waiting_time, remaining_time)
+
+    def _backoff_time(self, retry):
+        # Full jitter: spreads the retries of concurrent pollers over time.
+        return random.uniform(0, min(self.setting("retry_backoff") * 2**retry, self.setting("retry_backoff_max")))
+
+    def _post(self, function, waittime=None, max_waiting_time=None, polling_policy=None, **arguments):
+        start_time = time.monotonic()
+        body, retry_after = self._submit(function, **arguments)
+
+        if not body.get("status", False) or is_finished(body):
+            return body
 
-    if debug:
-        print(f"GET url for '{function}' is {url}")
+        # response has this format
+        # {"computationId":"9970243c-44f7-4150-ab81-29c725feeabf","status":"Pending","computationStoreTime":"2024-03-14T17:06:15.452113+00:00"}
+        # we need to do a GET to function/{computationId} to retrieve the actual response once calc finishes
+        return self._wait_or_fail(function, body, retry_after, waittime, max_waiting_time, polling_policy, start_time)
+
+    def _wait_or_fail(self, function, body, *arguments):
+        """Same as `_wait`, but the computation is marked as failed in the
+        journal if it cannot be retrieved, so that it is not reattached. Only
+        `resume` leaves the computations outstanding after an error."""
+        try:
+            return self._wait(function, body, *arguments)
+        except Exception:
+            self._finish(body["computationId"], {"status": "Failed"})
+            raise
+
+    def _wait(self, function, body, retry_after, waittime, max_waiting_time, polling_policy, start_time):
+        debug = self.setting("debug")
+        max_waiting_time = self.setting("API_timeout") if max_waiting_time is None else max_waiting_time
+        polling_policy = self.setting("polling_policy") if polling_policy is None else polling_policy
+        computation_id = body["computationId"]
+        url = _computation_url(self.base_url, function, computation_id)
+        headers = _headers(self.auth)
 
-    tottime = 0
-    API_timeout = 12 * 3600
-    valid_solution_identifiers = ["solution", "named_solution", "zscore"]
-    while tottime < API_timeout:
         if debug:
-            print(f"Waiting for {waittime}s for '{function}' to complete")
+            print(f"GET url for '{function}' is {url}")
+
+        schedule = polling_policy.schedule(body, retry_after, waittime)
+        while True:
+            remaining_time = start_time + max_waiting_time - time.monotonic()
+            if remaining_time <= 0:
+                raise Exception(f"Exceeded maximum time to complete computation with method '{function}'. Maximum time: {max_waiting_time / 3600:2.1f}h")
+            waittime = min(schedule.interval, remaining_time)
+            if debug:
+                print(f"Waiting for {waittime:.3g}s for '{function}' to complete")
 
-        time.sleep(waittime)
-        tottime += waittime
+            time.sleep(waittime)
 
-        body = _get(url, headers)
+            body, retry_after = self._get(url, headers, start_time + max_waiting_time)
 
-        for solution_identifier in valid_solution_identifiers:
-            if solution_identifier in body and body[solution_identifier]:
+            if is_finished(body):
                 if debug:
                     print(f"Found body:\n{body}")
-                print(f"solution found")
+                self._finish(computation_id, body)
+                if body.get("status") != "Failed":
+                    print(f"solution found")
                 return body
-        
-        if "status" in body and body["status"] == "Failed":
-            return body
-
-        waittime = min(2*waittime, 5)
-
-    if tottime >= API_timeout:
-        raise Exception(f"Exceeded maximum time to complete computation with method '{function}'. Maximum time: {API_timeout / 3600:2.1f}h")
 
-    raise Exception(f"Unable to complete computation with method '{function}'")
+            schedule.update(body, retry_after)
+
+    def _finish(self, computation_id, body):
+        journal = self.setting("journal")
+        if journal is not None:
+            journal.finish(self.base_url, computation_id, body.get("status"))
+
+    def _reattach(self, function, computation):
+        """Response body and Retry-After time of the first poll of an
+        outstanding computation of the journal, or None if the API does not
+        know it anymore, e.g. because it expired."""
+        computation_id = computation["computation_id"]
+        if self.setting("debug"):
+            print(f"Reattaching to computation {computation_id} of '{function}'")
+        try:
+            body, retry_after = self._get_computation(function, computation_id)
+        except requests.HTTPError as error:
+            if error.response is None or error.response.status_code not in (404, 410):
+                raise
+            body = None
+        if body is None or not body.get("status", False):
+            self.setting("journal").finish(self.base_url, computation_id, "Failed")
+            return None
+        return {
+            "computationId": computation_id,
+            "computationStoreTime": computation["computation_store_time"],
+        } | body, retry_after
+
+    def _submit(self, function, **arguments):
+        debug = self.setting("debug")
+        url_dict = self.url_dict
+        if function not in url_dict:
+            error_msg = f"Unknown API function {function}"
+            print(url_dict)
+            raise Exception(error_msg)
+
+        url = url_dict[function]
+        journal = self.setting("journal")
+        payload_hash = None
+        if journal is not None and "json" in arguments:
+            # A computation of the same payload that is still running, e.g.
+            # submitted before a restart, is reattached instead of submitted.
+            payload_hash = hash_payload(function, arguments["json"])
+            computation = journal.find(self.base_url, function, payload_hash, hash_credentials(self.auth))
+            if computation is not None:
+                reattached = self._reattach(function, computation)
+                if reattached is not None:
+                    return reattached
+
+        headers = _headers(self.auth)
+        post_headers = headers
+        if "json" in arguments:
+            arguments["data"], content_headers = _json_body(
+                arguments.pop("json"), self.setting("compression_threshold"), self.setting("compression_level")
+            )
+            post_headers = headers | content_headers
+        if debug:
+            _print_call("POST", url, post_headers, arguments, debug)
+        # Not retried: a computation could be created twice.
+        r = self.get_session().post(url=url, headers=post_headers, **arguments)
+        if debug:
+            print(f"Received request Response {r} with content:\n{r.content}")
+        if not r.ok:
+            error = f"Error returned from Inspiration-Q API. function: {function}. response: {r}"
+            if debug:
+                print(error)
+            raise Exception(error)
+
+        body = r.json()
+        if journal is not None and body.get("status", False) and not is_finished(body):
+            journal.record(self.base_url, function, body, payload_hash, hash_credentials(self.auth))
+        return body, _retry_after(r.headers)
+
+
+def _retry_after(headers):
+    """Seconds to wait according to a Retry-After header, either a number of
+    seconds or an HTTP date, or None."""
+    value = headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((date - datetime.datetime.now(datetime.timezone.utc)).total_seconds(), 0.0)
+
+
+def _age(computation_store_time):
+    """Seconds since the computationStoreTime of the API, an ISO 8601 date, or 0."""
+    if not computation_store_time:
+        return 0.0
+    try:
+        date = datetime.datetime.fromisoformat(computation_store_time)
+    except (TypeError, ValueError):
+        return 0.0
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return max((datetime.datetime.now(datetime.timezone.utc) - date).total_seconds(), 0.0)
+
+
+def _build_session(pool_size):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _headers(auth):
+    # requests decodes gzip and deflate responses transparently.
+    return auth | {"Accept-Encoding": "gzip, deflate"}
+
+
+def _computation_url(base_url, function, computation_id):
+    return base_url + "/" + function + "/" + computation_id
+
+
+def _json_body(obj, threshold, level):
+    """Body and headers of a JSON request.
+
+    The JSON is encoded incrementally. If it is shorter than threshold bytes it
+    is sent as is. Otherwise it is returned as a generator of gzip compressed
+    chunks, which requests sends with chunked transfer encoding, so that
+    neither the whole JSON nor the whole compressed body are kept in memory.
+    """
+    chunks = _iterencode_in_chunks(obj)
+    head = []
+    head_size = 0
+    for chunk in chunks:
+        head.append(chunk)
+        head_size += len(chunk)
+        if threshold is not None and head_size > threshold:
+            return (
+                _gzip_chunks(head, chunks, level),
+                {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+            )
+    return b"".join(head), {"Content-Type": "application/json"}
+
+
+def _iterencode_in_chunks(obj):
+    # Same encoding as requests.post(json=obj), in chunks of about
+    # _compression_chunk_size bytes instead of the tiny pieces of iterencode.
+    encoder = json.JSONEncoder(allow_nan=False)
+    pieces = []
+    size = 0
+    for piece in encoder.iterencode(obj):
+        pieces.append(piece)
+        size += len(piece)
+        if size >= _compression_chunk_size:
+            yield "".join(pieces).encode("utf-8")
+            pieces = []
+            size = 0
+    if pieces:
+        yield "".join(pieces).encode("utf-8")
+
+
+def _gzip_chunks(head, chunks, level):
+    # wbits=31 writes the gzip header and trailer around the deflate stream.
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in itertools.chain(head, chunks):
+        compressed_chunk = compressor.compress(chunk)
+        if compressed_chunk:
+            yield compressed_chunk
+    yield compressor.flush()
 
 
 def _specialize(base_url, entry_points):
     return {k: base_url + "/" + k for k in entry_points}
 
 
-def _maybe_trim(string, length=69):
+def _maybe_trim(string, debug, length=69):
     if debug == "short" and len(string) > length:
         return string[:length] + "..." + string[-1]
     return string
 
 
-def _print_call(type, url, headers, arguments):
+def _print_call(type, url, headers, arguments, debug):
     # TODO: Split "arguments" into 'data', 'json', 'files' and
     # produce more informative messages for each of them (e.g.,
     # separating the fields of 'json', describing files and size, etc)
     from datetime import datetime, timezone
     print(
         f"Sending {type} request to {url}\nwith header: {headers}\n"
-        f"and arguments: {_maybe_trim(str(arguments))}\n"
+        f"and arguments: {_maybe_trim(str(arguments), debug)}\n"
         f"at timestamp {datetime.now(timezone.utc)}", flush=True)
 
 
 _known_entry_points = {
     "v1/iq-finance/index-tracking"
 }
+
+
+polling_policy = PollingPolicy()
+_settings = (
+    "debug", "compression_threshold", "compression_level", "API_timeout", "polling_policy",
+    "pool_size", "max_retries", "retry_backoff", "retry_backoff_max", "retry_status_codes", "journal",
+)
+_default_client = IQClient()
@@ -0,0 +1,123 @@
+import contextlib
+import hashlib
+import json
+import sqlite3
+import time
+
+
+class ComputationJournal:
+    """Durable record of the computations created in the Inspiration-Q API.
+
+    The computations are stored in a SQLite database when the API accepts
+    them, and marked as finished when their result is retrieved, or as failed
+    when waiting for them fails or times out, so that a process that restarts
+    can wait for the computations that were running, with `iqrestapi.resume`,
+    instead of submitting them again. Only `resume` leaves the computations
+    outstanding after an error. The payload hash of every computation is also
+    stored, and submitting the same payload again to the same function with
+    the same credentials reattaches to its outstanding computation, if it was
+    stored in the API less than max_age seconds ago and the API still knows
+    it; otherwise the payload is submitted again. The credentials are stored
+    as a hash, see `hash_credentials`, never in clear.
+
+    The database can be shared by several threads and processes.
+
+    Parameters
+    ----------
+    path : str or os.PathLike
+        File of the SQLite database. It is created if it does not exist.
+    max_age : float, default=24 * 3600
+        Maximum age of the computations that are reattached, in seconds,
+        measured from their computationStoreTime, or from the time they were
+        recorded if it is unknown.
+
+    """
+
+    def __init__(self, path, max_age=24 * 3600):
+        self.path = path
+        self.max_age = max_age
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS computations ("
+            "base_url TEXT NOT NULL, function TEXT NOT NULL, computation_id TEXT NOT NULL, "
+            "payload_hash TEXT, computation_store_time TEXT, status TEXT, "
+            "creation_time REAL NOT NULL, finish_time REAL, credentials_hash TEXT, "
+            "PRIMARY KEY (base_url, computation_id))"
+        )
+        columns = [row["name"] for row in self._execute("PRAGMA table_info(computations)")]
+        if "credentials_hash" not in columns:
+            # Journal created by a version without credentials.
+            self._execute("ALTER TABLE computations ADD COLUMN credentials_hash TEXT")
+        self._execute(
+            "CREATE INDEX IF NOT EXISTS outstanding_computations "
+            "ON computations (base_url, function, payload_hash) WHERE finish_time IS NULL"
+        )
+
+    def record(self, base_url, function, body, payload_hash=None, credentials_hash=None):
+        """Record a computation accepted by the API, with response body."""
+        self._execute(
+            "INSERT OR REPLACE INTO computations (base_url, function, computation_id, payload_hash, "
+            "computation_store_time, status, creation_time, credentials_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (base_url, function, body["computationId"], payload_hash,
+             body.get("computationStoreTime"), body.get("status"), time.time(), credentials_hash)
+        )
+
+    def finish(self, base_url, computation_id, status):
+        """Mark a computation as finished, with its final status."""
+        self._execute(
+            "UPDATE computations SET status = ?, finish_time = ? WHERE base_url = ? AND computation_id = ?",
+            (status, time.time(), base_url, computation_id)
+        )
+
+    def find(self, base_url, function, payload_hash, credentials_hash=None):
+        """Latest outstanding computation of function with payload_hash,
+        created with credentials_hash, that is younger than max_age, or None."""
+        # julianday is NULL for a missing or invalid computationStoreTime.
+        rows = self._execute(
+            "SELECT * FROM computations WHERE base_url = ? AND function = ? AND payload_hash = ? "
+            "AND credentials_hash IS ? AND finish_time IS NULL "
+            "AND COALESCE((julianday('now') - julianday(computation_store_time)) * 86400, ? - creation_time) <= ? "
+            "ORDER BY creation_time DESC LIMIT 1",
+            (base_url, function, payload_hash, credentials_hash, time.time(), self.max_age)
+        )
+        return rows[0] if rows else None
+
+    def outstanding(self, base_url=None, function=None, credentials_hash=None):
+        """Computations that have not finished, from the oldest to the newest.
+        The arguments that are not None filter them.
+
+        Returns
+        -------
+        computations : list of dict
+            Rows of the journal, with keys base_url, function, computation_id,
+            payload_hash, computation_store_time, status, creation_time,
+            finish_time and credentials_hash.
+
+        """
+        return self._execute(
+            "SELECT * FROM computations WHERE finish_time IS NULL "
+            "AND (? IS NULL OR base_url = ?) AND (? IS NULL OR function = ?) "
+            "AND (? IS NULL OR credentials_hash = ?) ORDER BY creation_time",
+            (base_url, base_url, function, function, credentials_hash, credentials_hash)
+        )
+
+    def _execute(self, sql, parameters=()):
+        # A connection per operation, so that the journal can be used from any
+        # thread. The outer context manager closes it and the inner one commits.
+        with contextlib.closing(sqlite3.connect(self.path, timeout=60)) as connection, connection:
+            connection.row_factory = sqlite3.Row
+            return [dict(row) for row in connection.execute(sql, parameters)]
+
+
+def hash_credentials(auth):
+    """Hash of the authentication headers auth of a client, which identifies
+    its credentials without storing them."""
+    return hashlib.blake2b(json.dumps(auth, sort_keys=True).encode("utf-8"), digest_size=32).hexdigest()
+
+
+def hash_payload(function, obj):
+    """Hash of the JSON payload obj of a request to function. The keys are
+    sorted, so that it does not depend on their order."""
+    hash_object = hashlib.blake2b(function.encode("utf-8"), digest_size=32)
+    for chunk in json.JSONEncoder(allow_nan=False, sort_keys=True).iterencode(obj):
+        hash_object.update(chunk.encode("utf-8"))
+    return hash_object.hexdigest()
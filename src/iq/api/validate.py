@@ -1,3 +1,5 @@
+import hashlib
+
 import numpy as np
 
 
@@ -131,4 +133,84 @@ def validate_matrix(
         if np.any(eigenvalues_of_A < -tolerance):
             raise ValueError(f"The matrix {name_of_A} is not semidefinite positive. Its lowest eigenvalue is {eigenvalues_of_A[0]}")
 
-    return A
\ No newline at end of file
+    return A
+
+
+def is_sparse(A):
+    # scipy.sparse matrices and arrays, without importing scipy.
+    return hasattr(A, "tocoo") and hasattr(A, "nnz")
+
+
+def validate_sparse_matrix(A, name_of_A, max_dim0, max_dim1):
+    # Same checks as validate_matrix for a scipy.sparse matrix, in time
+    # proportional to its number of nonzero elements. It is returned in COO
+    # format, with the duplicates summed.
+    if len(A.shape) != 2:
+        raise ValueError(f"The object {name_of_A} is not a matrix, it has {len(A.shape)} dimensions.")
+
+    if (A.shape[0] > max_dim0 or A.shape[1] > max_dim1):
+        raise ValueError(f"The matrix {name_of_A} exceeds the maximum dimensions. It has shape {A.shape}, while the maximum allowed shape is ({max_dim0}, {max_dim1})")
+
+    A = A.tocoo()
+    A.sum_duplicates()
+    return A
+
+
+def densify(A):
+    # Dense np.ndarray of a matrix that may be sparse.
+    if not is_sparse(A):
+        return np.asarray(A)
+    A = A.tocoo()
+    dense_A = np.zeros(A.shape, dtype=np.double)
+    np.add.at(dense_A, (A.row, A.col), A.data)
+    return dense_A
+
+
+def validate_symmetric(A, name_of_A, tolerance=1e-7, block_size=256):
+    # Same check as np.allclose(A, A.T), but comparing blocks of rows with
+    # blocks of columns to avoid temporaries of the size of A.
+    A = np.asarray(A)
+    for ix in range(0, A.shape[0], block_size):
+        if not np.allclose(A[ix:ix + block_size], A[:, ix:ix + block_size].T, atol=tolerance, rtol=tolerance):
+            raise ValueError(f"The matrix {name_of_A} is not symmetric. If suitable, try replacing it by: A = (A + A.T)/2")
+    return A
+
+
+def validate_semidefinite_positive(A, name_of_A, tolerance=1e-7):
+    # A is semidefinite positive up to the tolerance if A + tolerance * I is
+    # positive definite, which a Cholesky factorization checks much faster than
+    # computing all the eigenvalues. These are only computed if it fails, to
+    # discard rounding errors and report the lowest eigenvalue.
+    A = np.asarray(A)
+    shifted_A = np.array(A, dtype=np.double)
+    shifted_A.flat[::A.shape[0] + 1] += tolerance
+    try:
+        np.linalg.cholesky(shifted_A)
+        return A
+    except np.linalg.LinAlgError:
+        pass
+    del shifted_A
+    eigenvalues_of_A = np.linalg.eigvalsh(A)
+    if np.any(eigenvalues_of_A < -tolerance):
+        raise ValueError(f"The matrix {name_of_A} is not semidefinite positive. Its lowest eigenvalue is {eigenvalues_of_A[0]}")
+    return A
+
+
+class MatrixCertificate:
+    """Proof that a matrix already passed a validation, so that it does not need
+    to be validated again. It stores a fingerprint of the contents of the
+    matrix, which is much faster to check than the validation itself."""
+
+    def __init__(self, A, description):
+        self.shape = np.shape(A)
+        self.fingerprint = fingerprint(A)
+        self.description = description
+
+    def matches(self, A):
+        A = np.asarray(A)
+        return A.shape == self.shape and fingerprint(A) == self.fingerprint
+
+
+def fingerprint(A):
+    A = np.ascontiguousarray(A, dtype=np.double)
+    return hashlib.blake2b(A.view(np.uint8), digest_size=20).hexdigest()
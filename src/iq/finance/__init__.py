@@ -1 +1,4 @@
-from .index_tracking import *
\ No newline at end of file
+from .index_tracking import *
+from .index_tracking_cache import *
+from .feasibility import *
+from .population_annealing import *
@@ -0,0 +1,287 @@
+import numpy as np
+
+from iq.finance.population_annealing import _EnergyFunction, _parse_payload
+
+__all__ = ["check_feasibility", "check_payload_feasibility"]
+
+# Relative tolerances of the checks. A problem is only reported as infeasible
+# if it violates a necessary condition by more than the tolerance times the
+# scale of the weights, so that rounding errors, e.g. of a previous portfolio
+# that sums 1 +- 1e-5, do not reject problems that the solvers accept.
+LINEAR_CONSTRAINTS_TOLERANCE = 1e-6
+SALES_TOLERANCE = 1e-4
+
+
+def check_feasibility(
+    assets_utility_matrix,
+    assets_to_benchmark_utility_vector,
+    portfolio_size,
+    asset_names,
+    b_solve_relaxation=True,
+    num_relaxation_iterations=1000,
+    **constraints
+):
+    """Check locally whether an index tracking problem can be feasible, and
+    bound its tracking error from below.
+
+    The arguments are the same as those of
+    `iq.finance.index_tracking.solve_index_tracking`, e.g.
+    `check_feasibility(C, g, 30, names, minimum_weight=0.01, sectorial_weights=...)`.
+    See `check_payload_feasibility` for the checks.
+
+    Returns
+    -------
+    report : dict
+        See `check_payload_feasibility`.
+
+    """
+    payload = {
+        "assets_utility_matrix": assets_utility_matrix,
+        "assets_to_benchmark_utility_vector": assets_to_benchmark_utility_vector,
+        "portfolio_size": portfolio_size,
+        "asset_names": asset_names,
+    } | {key: value for key, value in constraints.items() if value is not None}
+    return check_payload_feasibility(payload, b_solve_relaxation, num_relaxation_iterations)
+
+
+def check_payload_feasibility(payload, b_solve_relaxation=True, num_relaxation_iterations=1000):
+    """Pre-flight checks of the request payload of the index tracking service.
+
+    The cheap checks are necessary conditions on the weights, the linear and
+    sectorial constraints and the rotation constraints, computed exactly with
+    the cardinality of the portfolio in O(num_constraints * num_assets) time.
+    The sectorial constraints are only checked if every asset has a sector with
+    a weight; otherwise the API decides how to handle them.
+
+    If b_solve_relaxation, the continuous relaxation of the problem, without
+    the cardinality constraint and with 0 <= w_i <= maximum_weight, is solved
+    approximately. Its Lagrange multipliers give either a proof that the
+    problem is infeasible, or a lower bound of the cost
+
+        w @ assets_utility_matrix @ w - 2 assets_to_benchmark_utility_vector @ w = TE**2 - Var(r_I)
+
+    of any feasible portfolio. Both are valid however inaccurate the relaxed
+    solution is, because they follow from the convexity of the problem:
+    for any multipliers l >= 0 and any point v, and for every feasible w,
+
+        cost(w) >= cost(w) + l @ h(w) >= L(v) + grad L(v) @ (w - v)
+
+    with h(w) <= 0 the constraints and L = cost + l @ h, and the right hand
+    side is minimized exactly over the portfolios with portfolio_size assets
+    and weights between the bounds.
+
+    Parameters
+    ----------
+    payload : dict
+        Request of the index tracking service, with the arrays as NumPy
+        arrays, nested lists or encoded by `iq.api.encoding.encode_array`.
+    b_solve_relaxation : bool, default=True
+        Solve the continuous relaxation. Otherwise only the cheap checks are done.
+    num_relaxation_iterations : int, default=1000
+        Number of projected gradient iterations of the relaxation.
+
+    Returns
+    -------
+    report : dict
+        {"b_infeasible": bool, "error_description": str | None,
+        "cost_lower_bound": float | None}. b_infeasible is True only if the
+        problem is proved to be infeasible, and error_description explains why.
+
+    """
+    if payload.get("sectorial_distribution") is not None and not _has_complete_sectors(payload):
+        payload = {key: value for key, value in payload.items() if key != "sectorial_distribution"}
+    problem = _parse_payload(payload)
+    report = {"b_infeasible": False, "error_description": None, "cost_lower_bound": None}
+
+    error_description = _cheap_checks(problem, payload)
+    if error_description is None and b_solve_relaxation:
+        error_description, report["cost_lower_bound"] = _relaxation_bound(problem, num_relaxation_iterations)
+    if error_description is not None:
+        report["b_infeasible"] = True
+        report["error_description"] = "Feasibility: " + error_description
+    return report
+
+
+def _cheap_checks(problem, payload):
+    """Description of the first necessary condition of feasibility that fails,
+    or None."""
+    num_assets = problem["assets_utility_matrix"].shape[0]
+    portfolio_size = problem["portfolio_size"]
+    minimum_weight = problem["minimum_weight"]
+    maximum_weight = problem["maximum_weight"]
+    sum_of_portfolio_weights = problem["sum_of_portfolio_weights"]
+    weights_tolerance = LINEAR_CONSTRAINTS_TOLERANCE * max(1.0, abs(sum_of_portfolio_weights))
+
+    if portfolio_size <= 0 or portfolio_size > num_assets:
+        return f"Portfolio_size={portfolio_size} is not valid. It must be in the range: 0 < portfolio_size <= {num_assets}, with {num_assets} the number of assets without missing data."
+    if minimum_weight > maximum_weight:
+        return f"minimum_weight={minimum_weight} is larger than maximum_weight={maximum_weight}."
+    if portfolio_size * minimum_weight > sum_of_portfolio_weights + weights_tolerance:
+        return f"minimum_weight * portfolio_size = {portfolio_size * minimum_weight} is larger than sum_of_portfolio_weights={sum_of_portfolio_weights}."
+    if portfolio_size * maximum_weight < sum_of_portfolio_weights - weights_tolerance:
+        return f"maximum_weight * portfolio_size = {portfolio_size * maximum_weight} is smaller than sum_of_portfolio_weights={sum_of_portfolio_weights}."
+
+    # Range of every linear constraint over the portfolios.
+    linear_constraints_matrix = problem["linear_constraints_matrix"]
+    if linear_constraints_matrix.shape[0] > 0:
+        minimum_values = _minimize_linear_functions(linear_constraints_matrix, problem)
+        maximum_values = -_minimize_linear_functions(-linear_constraints_matrix, problem)
+        tolerance = LINEAR_CONSTRAINTS_TOLERANCE * (1 + np.abs(linear_constraints_matrix).sum(axis=1))
+        ix_infeasible = np.flatnonzero(
+            (problem["lower_bounds_vector"] > maximum_values + tolerance)
+            | (problem["upper_bounds_vector"] < minimum_values - tolerance)
+        )
+        if ix_infeasible.size > 0:
+            i = ix_infeasible[0]
+            return f"The linear constraint {i} must be between {problem['lower_bounds_vector'][i]} and {problem['upper_bounds_vector'][i]}, but it can only take values between {minimum_values[i]} and {maximum_values[i]}. The sectorial constraints follow the linear constraints."
+
+    # Number of assets needed to reach the minimum weight of every sector.
+    if payload.get("sectorial_distribution") is not None:
+        error_description = _check_sectors(problem, payload)
+        if error_description is not None:
+            return error_description
+
+    # Rotation constraints.
+    previous_weights = problem["previous_weights"]
+    num_sold_companies = (
+        problem["num_previous_assets"] - np.count_nonzero(previous_weights)
+        + max(np.count_nonzero(previous_weights) - portfolio_size, 0)
+    )
+    if 0 <= problem["max_companies_rotation"] < num_sold_companies:
+        return f"At least {num_sold_companies} companies of the previous portfolio must be sold, because they have missing data, are not in the assets or do not fit in the portfolio, but max_companies_rotation={problem['max_companies_rotation']}."
+    if problem["max_sales_rotation"] >= 0:
+        # The assets of the previous portfolio that do not fit in it are sold,
+        # and the weights of the rest cannot sum more than their previous
+        # weights, so at least the budget that is left must be bought.
+        previous_weights_outside = problem["total_previous_weight"] - np.sum(np.abs(previous_weights))
+        num_previous_assets_inside = np.count_nonzero(previous_weights)
+        num_dropped_assets = max(num_previous_assets_inside - portfolio_size, 0)
+        dropped_weights = np.sum(np.sort(np.abs(previous_weights))[num_assets - num_previous_assets_inside:][:num_dropped_assets])
+        minimum_sales = (
+            previous_weights_outside
+            + max(
+                abs(np.sum(previous_weights) - sum_of_portfolio_weights),
+                dropped_weights + max(sum_of_portfolio_weights - np.sum(np.abs(previous_weights)) + dropped_weights, 0)
+            )
+        ) / 2
+        scale = max(1.0, problem["total_previous_weight"], sum_of_portfolio_weights)
+        if minimum_sales > problem["max_sales_rotation"] + SALES_TOLERANCE * scale:
+            return f"At least {minimum_sales} of the previous portfolio must be sold, but max_sales_rotation={problem['max_sales_rotation']}."
+    return None
+
+
+def _check_sectors(problem, payload):
+    from iq.finance.index_tracking import build_matrix_of_sector_restrictions
+
+    asset_names = np.asarray(_parse_names(payload))
+    sectorial_weights = payload["sectorial_weights"]
+    r, r_min = build_matrix_of_sector_restrictions(
+        asset_names, sectorial_weights, payload["sectorial_distribution"],
+        float(payload["sectorial_weight_tolerance"])
+    )
+    num_sectors = len(sectorial_weights)
+    b_available_assets = np.isin(asset_names, problem["asset_names"])
+    num_available_assets = np.sum(r[:num_sectors, b_available_assets], axis=1)
+    num_needed_assets = np.ceil(np.maximum(r_min[:num_sectors], 0) / problem["maximum_weight"] - LINEAR_CONSTRAINTS_TOLERANCE)
+
+    ix_short_sectors = np.flatnonzero(num_needed_assets > num_available_assets)
+    if ix_short_sectors.size > 0:
+        i = ix_short_sectors[0]
+        return f"The sector {list(sectorial_weights)[i]} needs at least {int(num_needed_assets[i])} assets to reach its minimum weight {r_min[i]}, but only {int(num_available_assets[i])} assets without missing data belong to it."
+    if np.sum(num_needed_assets) > problem["portfolio_size"]:
+        return f"The sectors need at least {int(np.sum(num_needed_assets))} assets to reach their minimum weights, but portfolio_size={problem['portfolio_size']}."
+    return None
+
+
+def _has_complete_sectors(payload):
+    """Whether every asset has a sector, and every sector a weight."""
+    sectorial_weights = payload.get("sectorial_weights")
+    sectorial_distribution = payload["sectorial_distribution"]
+    if sectorial_weights is None or payload.get("sectorial_weight_tolerance") is None:
+        return False
+    return all(
+        name in sectorial_distribution and sectorial_distribution[name] in sectorial_weights
+        for name in _parse_names(payload)
+    )
+
+
+def _parse_names(payload):
+    asset_names = payload["asset_names"]
+    return asset_names.tolist() if isinstance(asset_names, np.ndarray) else list(asset_names)
+
+
+def _minimize_linear_functions(c, problem):
+    """Exact minimum of c @ w over the portfolios of portfolio_size assets with
+    minimum_weight <= w_i <= maximum_weight and sum(w) = sum_of_portfolio_weights,
+    for every row of c.
+
+    For a given set of assets, the minimum puts the minimum weight in all of
+    them, and the rest of the budget, in amounts up to
+    maximum_weight - minimum_weight, in the assets with the lowest c. Both
+    terms are lowest with the portfolio_size assets with the lowest c.
+    """
+    portfolio_size = problem["portfolio_size"]
+    minimum_weight = problem["minimum_weight"]
+    capacity = problem["maximum_weight"] - minimum_weight
+    c = np.atleast_2d(c)
+    lowest_c = np.sort(np.partition(c, portfolio_size - 1, axis=1)[:, :portfolio_size], axis=1)
+    remaining_budget = problem["sum_of_portfolio_weights"] - portfolio_size * minimum_weight
+    amounts = np.clip(remaining_budget - capacity * np.arange(portfolio_size), 0, capacity)
+    return minimum_weight * np.sum(lowest_c, axis=1) + lowest_c @ amounts
+
+
+def _relaxation_bound(problem, num_iterations):
+    """Infeasibility proof or cost lower bound from the continuous relaxation."""
+    num_assets = problem["assets_utility_matrix"].shape[0]
+    relaxed_problem = problem | {
+        "portfolio_size": num_assets,
+        "minimum_weight": 0.0,
+        "max_companies_rotation": -1,
+    }
+    energy_function = _EnergyFunction(relaxed_problem)
+    ix_support = np.arange(num_assets)[None, :]
+    weights = energy_function.project(np.zeros((1, num_assets)))
+    multipliers = energy_function.initial_multipliers(1)
+    num_inner_iterations = 20
+    weights, multipliers = energy_function.minimize_weights(
+        ix_support, weights, multipliers, num_inner_iterations,
+        num_multiplier_updates=max(num_iterations // num_inner_iterations, 1)
+    )
+    weights = weights[0]
+    multipliers = multipliers[0]
+
+    # Value and gradient of l @ h at the relaxed solution, and of the cost.
+    constraints = energy_function.constraints(ix_support, weights[None, :])[0]
+    weighted_constraints = multipliers @ np.where(multipliers > 0, constraints, 0)
+    num_linear_constraints = energy_function.num_linear_constraints
+    constraints_gradient = energy_function.linear_constraints_matrix.T @ (
+        multipliers[num_linear_constraints:2 * num_linear_constraints] - multipliers[:num_linear_constraints]
+    )
+    if energy_function.b_sales_rotation:
+        constraints_gradient += multipliers[-1] * np.sign(weights - energy_function.previous_weights) / 2
+
+    # Every feasible w has l @ h(w) <= 0. If its linearization is positive over
+    # all the portfolios, there are none.
+    minimum_weighted_constraints = (
+        weighted_constraints - constraints_gradient @ weights
+        + _minimize_linear_functions(constraints_gradient, problem)[0]
+    )
+    if minimum_weighted_constraints > LINEAR_CONSTRAINTS_TOLERANCE * (1 + np.sum(multipliers)):
+        return (
+            f"The continuous relaxation of the problem proves that the constraints cannot be satisfied: a combination of them is at least {minimum_weighted_constraints} > 0 for every portfolio.",
+            None
+        )
+
+    cost = (
+        weights @ energy_function.utility_matrix @ weights
+        - 2 * energy_function.utility_vector @ weights
+    )
+    gradient = (
+        2 * energy_function.utility_matrix @ weights - 2 * energy_function.utility_vector
+        + constraints_gradient
+    )
+    cost_lower_bound = (
+        cost + weighted_constraints - gradient @ weights
+        + _minimize_linear_functions(gradient, problem)[0]
+    )
+    return None, float(cost_lower_bound * energy_function.scale)
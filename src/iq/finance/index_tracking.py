@@ -1,34 +1,82 @@
+import asyncio
+import concurrent.futures
+import inspect
+import time
+
 import numpy as np
 
+from iq.api import encoding
 from iq.api import iqrestapi
 from iq.api import validate
+from iq.finance import feasibility
+from iq.finance import population_annealing
+
+MAX_ARRAY_DIM = 2048
 
 
 def build_matrix_of_sector_restrictions(
     asset_names: np.ndarray,
     sectorial_weights: dict,
     sectorial_distribution: dict,
-    sectorial_weight_tolerance: float
+    sectorial_weight_tolerance: float,
+    b_return_sparse: bool = False
 ):
-    sectors = np.array(list(sectorial_weights.keys()))
-    num_sectors = sectors.size
+    """Linear constraints r @ w >= r_min that keep the weight of every sector
+    within sectorial_weight_tolerance of its weight in sectorial_weights.
+
+    Parameters
+    ----------
+    asset_names : np.ndarray[(num_assets,)]
+        Tickers of the assets, in the order of the portfolio weights.
+    sectorial_weights : dict
+        Weight of every sector.
+    sectorial_distribution : dict
+        Sector of every ticker.
+    sectorial_weight_tolerance : float
+        Relative tolerance of the sector weights, e.g. 0.05 for 5%.
+    b_return_sparse : bool, default=False
+        If True, r is returned as a scipy.sparse.csr_array, with 2 nonzero
+        elements per asset. Requires scipy.
+
+    Returns
+    -------
+    r : np.ndarray[(2 * num_sectors, num_assets), dtype=np.double] or scipy.sparse.csr_array
+    r_min : np.ndarray[(2 * num_sectors,), dtype=np.double]
+
+    """
+    sectors = list(sectorial_weights.keys())
+    num_sectors = len(sectors)
     num_assets = asset_names.size
 
-    # Make matrix of belongings.
-    matrix_of_belongings = np.zeros((num_sectors, num_assets), dtype=np.double)
-    for i, ticker in enumerate(asset_names):
+    # Code of the sector of every asset.
+    sector_codes = {sector: i for i, sector in enumerate(sectors)}
+    ix_of_sectors = np.empty(num_assets, dtype=np.intp)
+    for i, ticker in enumerate(asset_names.tolist()):
         if ticker not in sectorial_distribution:
             raise ValueError(f"The ticker {ticker} is in the assets of the assets utility matrix but is not included in the tickers of the sector restrictions.")
         sector = sectorial_distribution[ticker]
-        ix_of_sector = np.where(sectors == sector)[0][0]
-        matrix_of_belongings[ix_of_sector, i] = 1.0
-
-    np_sectorial_weights = np.zeros(num_sectors)
-    for i, sector in enumerate(sectors):
-        np_sectorial_weights[i] = sectorial_weights[sector]
+        if sector not in sector_codes:
+            raise ValueError(f"The sector {sector} of the ticker {ticker} is not included in the sectorial weights.")
+        ix_of_sectors[i] = sector_codes[sector]
+
+    np_sectorial_weights = np.fromiter(sectorial_weights.values(), dtype=np.double, count=num_sectors)
+
+    # Write restrictions in matrix vector form, r = [belongings; -belongings].
+    ix_of_assets = np.arange(num_assets)
+    if b_return_sparse:
+        import scipy.sparse
+        r = scipy.sparse.csr_array(
+            (
+                np.concatenate((np.ones(num_assets), -np.ones(num_assets))),
+                (np.concatenate((ix_of_sectors, ix_of_sectors + num_sectors)), np.concatenate((ix_of_assets, ix_of_assets)))
+            ),
+            shape=(2 * num_sectors, num_assets)
+        )
+    else:
+        r = np.zeros((2 * num_sectors, num_assets), dtype=np.double)
+        r[ix_of_sectors, ix_of_assets] = 1.0
+        r[ix_of_sectors + num_sectors, ix_of_assets] = -1.0
 
-    # Write restrictions in matrix vector form.
-    r = np.concatenate((matrix_of_belongings, -matrix_of_belongings), axis=0)
     r_min = np.zeros(2 * num_sectors)
     # 1: weights must be higher than, e.g, 95% of the current weight.
     r_min[:num_sectors] = np_sectorial_weights * (1 - sectorial_weight_tolerance)
@@ -38,6 +86,83 @@ def build_matrix_of_sector_restrictions(
     return r, r_min
 
 
+def stack_linear_constraints(*linear_constraints_matrices):
+    """Stack several matrices of linear constraints, e.g. sector, country and
+    liquidity constraints, into one. If any of them is sparse the result is a
+    scipy.sparse.csr_array, without densifying the sparse ones."""
+    if any(validate.is_sparse(matrix) for matrix in linear_constraints_matrices):
+        import scipy.sparse
+        return scipy.sparse.vstack(linear_constraints_matrices, format="csr")
+    return np.concatenate(linear_constraints_matrices, axis=0)
+
+
+def certify_assets_utility_matrix(assets_utility_matrix):
+    """Validate an assets utility matrix once, as `solve_index_tracking` does,
+    and return a certificate that skips its validation in later calls.
+
+    Parameters
+    ----------
+    assets_utility_matrix : ndarray[(num_assets, num_assets), dtype=np.double]
+        Quadratic utility matrix between all assets, e.g. from
+        `iq.tools.quadratic_utility.compute_covariance_matrix`.
+
+    Returns
+    -------
+    certificate : validate.MatrixCertificate
+        Certificate to pass as `assets_utility_matrix_certificate`.
+
+    """
+    _validate_assets_utility_matrix(assets_utility_matrix, "fast", None)
+    return validate.MatrixCertificate(assets_utility_matrix, "assets_utility_matrix")
+
+
+def _validate_assets_utility_matrix(assets_utility_matrix, validation, certificate):
+    """Validate the assets utility matrix and return the indices of the assets
+    without missing data."""
+    if validation not in ["full", "fast"]:
+        raise ValueError(f"Validation '{validation}' is not valid. Possible values are 'full' or 'fast'.")
+
+    b_certified = certificate is not None and certificate.matches(assets_utility_matrix)
+    # Do a check of the utility matrix without the semidefinite positive check,
+    # because missing data makes it non semidefinite positive.
+    validate.validate_matrix(
+        assets_utility_matrix, "assets_utility_matrix",
+        MAX_ARRAY_DIM, MAX_ARRAY_DIM,
+        b_A_must_be_square=True,
+        b_A_must_be_symmetric=validation == "full" and not b_certified,
+        b_A_must_be_semidefinite_positive=False
+    )
+
+    # Remove assets with missing data. These are the ones that have -1 in the
+    # diagonal elements of the assets_utility_matrix.
+    ix_of_assets_without_missing_data = np.where(np.diag(assets_utility_matrix) != -1)[0]
+    if b_certified:
+        return ix_of_assets_without_missing_data
+
+    if validation == "fast":
+        validate.validate_symmetric(assets_utility_matrix, "assets_utility_matrix")
+        assets_utility_matrix_without_missing_data = assets_utility_matrix[
+            np.ix_(ix_of_assets_without_missing_data, ix_of_assets_without_missing_data)
+        ]
+        validate.validate_semidefinite_positive(
+            assets_utility_matrix_without_missing_data, "assets_utility_matrix_without_missing_data"
+        )
+        return ix_of_assets_without_missing_data
+
+    I, J = np.meshgrid(ix_of_assets_without_missing_data, ix_of_assets_without_missing_data)
+    assets_utility_matrix_without_missing_data = np.ascontiguousarray(assets_utility_matrix[I, J])
+
+    # Check again that the remainding matrix is semidefinite positive.
+    validate.validate_matrix(
+        assets_utility_matrix_without_missing_data, "assets_utility_matrix_without_missing_data",
+        MAX_ARRAY_DIM, MAX_ARRAY_DIM,
+        b_A_must_be_square=True,
+        b_A_must_be_symmetric=True,
+        b_A_must_be_semidefinite_positive=True
+    )
+    return ix_of_assets_without_missing_data
+
+
 def solve_index_tracking(
     assets_utility_matrix,
     assets_to_benchmark_utility_vector,
@@ -53,7 +178,13 @@ def solve_index_tracking(
     sectorial_weight_tolerance=None,
     sum_of_portfolio_weights=1.0,
     random_number_generator_seed=123321,
-    description=""
+    description="",
+    validation="full",
+    assets_utility_matrix_certificate=None,
+    wire_format="json",
+    backend="remote",
+    feasibility_check="fast",
+    client=None
 ):
     """Solve the index tracking (IT) problem using population annealing.
 
@@ -122,8 +253,10 @@ def solve_index_tracking(
         Lower bound for the elements of the solution portfolio.
     maximum_weight : float, default=1.0
         Upper bound for the elements of the solution portfolio.
-    linear_constraints_matrix : ndarray[(num_inequality_constraints, num_assets), dtype=np.double], default=None
-        Matrix of linear inequality constraints.
+    linear_constraints_matrix : ndarray[(num_inequality_constraints, num_assets), dtype=np.double] or scipy.sparse matrix, default=None
+        Matrix of linear inequality constraints. Sparse matrices, e.g. from
+        `build_matrix_of_sector_restrictions(..., b_return_sparse=True)`, are
+        validated from their nonzero elements and only densified to send them.
     lower_bounds_vector : ndarray[(num_inequality_constraints), dtype=np.double], default=None
         Vector with the minimum values of the linear inequality constraints.
     upper_bounds_vector : ndarray[(num_inequality_constraints), dtype=np.double], default=None
@@ -149,6 +282,42 @@ def solve_index_tracking(
         Random number generator seed for Monte Carlo
     description : str, optional, default=""
         Small descriptive name for this computation.
+    validation : str, {"full", "fast"}, optional, default="full"
+        Validation of the assets utility matrix. "full" checks the symmetry of
+        the whole matrix and of the assets without missing data, and computes
+        all the eigenvalues of the latter to check that it is semidefinite
+        positive. "fast" checks the symmetry once by blocks and the
+        semidefinite positiveness with a Cholesky factorization, and only
+        computes the eigenvalues if it fails.
+    assets_utility_matrix_certificate : validate.MatrixCertificate, optional, default=None
+        Certificate returned by `certify_assets_utility_matrix` for this
+        matrix. If it matches the matrix, the validation is skipped, e.g. when
+        solving several problems with the same matrix.
+    wire_format : str, {"json", "binary"}, optional, default="json"
+        Format of the arrays in the request. "json" sends them as nested lists
+        of numbers. "binary" sends them as base64 encoded float64 bytes with
+        their dtype and shape, see `iq.api.encoding.encode_array`, with only
+        the upper triangle of the assets utility matrix. For 2048 assets the
+        request is about 22 MB instead of about 90 MB.
+    backend : str or callable, {"remote", "local"}, optional, default="remote"
+        Solver of the problem. "remote" solves it in the Inspiration-Q API.
+        "local" solves it offline with a
+        `iq.finance.population_annealing.PopulationAnnealingSolver`. Any key
+        of `BACKENDS`, or a callable that takes the request payload, with the
+        arrays as NumPy arrays, and returns the response of the API, e.g. a
+        `PopulationAnnealingSolver` with other parameters, can also be used.
+    feasibility_check : str, {"none", "fast", "relaxation"}, optional, default="fast"
+        Local checks before solving, see
+        `iq.finance.feasibility.check_payload_feasibility`. Problems that are
+        proved to be infeasible fail without being solved. "fast" only checks
+        necessary conditions on the weights and the linear, sectorial and
+        rotation constraints, in milliseconds. "relaxation" also solves the
+        continuous relaxation of the problem, which takes longer but detects
+        combinations of constraints that cannot be satisfied.
+    client : iq.api.iqrestapi.IQClient, optional, default=None
+        Client of the API, with its own credentials and connection pool, used
+        by the "remote" backend. Defaults to the credentials of the module
+        `iqrestapi`, set with `iqrestapi.initialize_credentials`.
 
     Returns
     -------
@@ -171,18 +340,12 @@ def solve_index_tracking(
 
     # Array and input arguments validation.
     try:
-        MAX_ARRAY_DIM = 2048
-
         num_assets = assets_utility_matrix.shape[0]
-        # Do a check of the utility matrix without the semidefinite positive check,
-        # because missing data makes it non semidefinite positive.
-        validate.validate_matrix(
-            assets_utility_matrix, "assets_utility_matrix",
-            MAX_ARRAY_DIM, MAX_ARRAY_DIM,
-            b_A_must_be_square=True,
-            b_A_must_be_symmetric=True,
-            b_A_must_be_semidefinite_positive=False
+        ix_of_assets_without_missing_data = _validate_assets_utility_matrix(
+            assets_utility_matrix, validation, assets_utility_matrix_certificate
         )
+        num_assets_without_missing_data = ix_of_assets_without_missing_data.size
+
         validate.validate_vector(
             assets_to_benchmark_utility_vector, "assets_to_benchmark_utility_vector",
             num_assets,
@@ -196,28 +359,15 @@ def solve_index_tracking(
             name_of_variable_with_equivalent_size=f"the dimensions of the assets utility matrix"
         )
 
-        # Remove assets with missing data. These are the ones that have -1 in the
-        # diagonal elements of the assets_utility_matrix.
-        ix_of_assets_without_missing_data = np.where(np.diag(assets_utility_matrix) != -1)[0]
-        num_assets_without_missing_data = ix_of_assets_without_missing_data.size
-        I, J = np.meshgrid(ix_of_assets_without_missing_data, ix_of_assets_without_missing_data)
-        assets_utility_matrix_without_missing_data = np.ascontiguousarray(assets_utility_matrix[I, J])
-
-        # Check again that the remainding matrix is semidefinite positive.
-        validate.validate_matrix(
-            assets_utility_matrix_without_missing_data, "assets_utility_matrix_without_missing_data",
-            MAX_ARRAY_DIM, MAX_ARRAY_DIM,
-            b_A_must_be_square=True,
-            b_A_must_be_symmetric=True,
-            b_A_must_be_semidefinite_positive=True
-        )
-
         b_there_are_linear_inequalities = linear_constraints_matrix is not None
         if b_there_are_linear_inequalities:
             if lower_bounds_vector is None and upper_bounds_vector is None:
                 raise ValueError("There is a matrix of linear inequalities 'linear_constraints_matrix', but both 'lower_bounds_vector' and 'upper_bounds_vector' are None.")
 
-            linear_constraints_matrix = validate.validate_matrix(linear_constraints_matrix, "linear_constraints_matrix", MAX_ARRAY_DIM, MAX_ARRAY_DIM)
+            if validate.is_sparse(linear_constraints_matrix):
+                linear_constraints_matrix = validate.validate_sparse_matrix(linear_constraints_matrix, "linear_constraints_matrix", MAX_ARRAY_DIM, MAX_ARRAY_DIM)
+            else:
+                linear_constraints_matrix = validate.validate_matrix(linear_constraints_matrix, "linear_constraints_matrix", MAX_ARRAY_DIM, MAX_ARRAY_DIM)
             number_of_linear_inequalities = linear_constraints_matrix.shape[0]
             if linear_constraints_matrix.shape[1] != num_assets:
                 raise ValueError(f"The linear inequalities in the matrix linear_constraints_matrix, linear_constraints_matrix.shape[1]={linear_constraints_matrix.shape[1]}, do not have the same size as the dimensions of the assets utility matrix.")
@@ -245,10 +395,17 @@ def solve_index_tracking(
         return optimal_portfolio, status, error_description
 
     try:
-
+        if wire_format not in ["json", "binary"]:
+            raise ValueError(f"Wire format '{wire_format}' is not valid. Possible values are 'json' or 'binary'.")
+        if not callable(backend) and backend not in BACKENDS:
+            raise ValueError(f"Backend '{backend}' is not valid. Possible values are {list(BACKENDS)} or a callable.")
+        if feasibility_check not in ["none", "fast", "relaxation"]:
+            raise ValueError(f"Feasibility check '{feasibility_check}' is not valid. Possible values are 'none', 'fast' or 'relaxation'.")
+
+        # The arrays are kept as NumPy arrays until they are sent.
         json_args={
-            "assets_utility_matrix": assets_utility_matrix.tolist(),
-            "assets_to_benchmark_utility_vector": assets_to_benchmark_utility_vector.tolist(),
+            "assets_utility_matrix": validate.densify(assets_utility_matrix),
+            "assets_to_benchmark_utility_vector": validate.densify(assets_to_benchmark_utility_vector),
             "portfolio_size": validate.integer(portfolio_size, 1, num_assets-1),
             "asset_names": asset_names.tolist(),
             "minimum_weight": validate.real(minimum_weight),
@@ -259,9 +416,9 @@ def solve_index_tracking(
         }
 
         if b_there_are_linear_inequalities:
-            json_args |= { "linear_constraints_matrix": linear_constraints_matrix.tolist() }
-            json_args |= { "lower_bounds_vector": lower_bounds_vector.tolist() }
-            json_args |= { "upper_bounds_vector": upper_bounds_vector.tolist() }
+            json_args |= { "linear_constraints_matrix": validate.densify(linear_constraints_matrix) }
+            json_args |= { "lower_bounds_vector": validate.densify(lower_bounds_vector) }
+            json_args |= { "upper_bounds_vector": validate.densify(upper_bounds_vector) }
 
         if previous_portfolio is not None:
             validate.dictionary(previous_portfolio)
@@ -277,15 +434,292 @@ def solve_index_tracking(
             json_args |= { "sectorial_distribution": sectorial_distribution }
             json_args |= { "sectorial_weights": sectorial_weights }
             json_args |= { "sectorial_weight_tolerance": validate.real(sectorial_weight_tolerance) }
+
+        if feasibility_check != "none":
+            report = feasibility.check_payload_feasibility(
+                json_args, b_solve_relaxation=feasibility_check == "relaxation"
+            )
+            if report["b_infeasible"]:
+                return optimal_portfolio, "Failed", report["error_description"]
+
+        # Only the remote backend needs the arrays serialized.
+        if backend == "remote":
+            json_args = _encode_payload(json_args, wire_format)
     except Exception as error:
         status = "Failed"
         error_description = "Validation: ", repr(error)
         return optimal_portfolio, status, error_description
 
-    r_post = iqrestapi.post(
-        "v1/iq-finance/index-tracking",
+    if backend == "remote":
+        r_post = _solve_remotely(json_args, client)
+    else:
+        solve = backend if callable(backend) else BACKENDS[backend]
+        r_post = solve(json_args)
+    return _result_from_response(r_post)
+
+
+def solve_index_tracking_batch(
+    problems,
+    max_in_flight=8,
+    max_requests_per_second=None,
+    b_as_completed=False,
+    wire_format="json",
+    polling_policy=None,
+    timeout=None,
+    client=None
+):
+    """Solve several index tracking problems concurrently in the Inspiration-Q API.
+
+    Up to max_in_flight problems are validated and uploaded in parallel
+    threads, and a single poller checks the state of all the computations that
+    are running in the API, so that the total time is bounded by the slowest
+    computations instead of by the sum of all of them. Every computation is
+    polled on its own schedule, see `iqrestapi.PollingPolicy`. The problems
+    with a "local" or callable backend are solved in the threads instead.
+
+    Parameters
+    ----------
+    problems : list of dict
+        Arguments of `solve_index_tracking` of every problem, e.g.
+        [{"assets_utility_matrix": C, "assets_to_benchmark_utility_vector": g,
+        "portfolio_size": 30, "asset_names": names}, ...].
+    max_in_flight : int, default=8
+        Maximum number of problems that are being uploaded or computed at the
+        same time.
+    max_requests_per_second : float, optional, default=None
+        Maximum rate of the requests to the API, both submissions and polls,
+        to stay under the API quotas. If None, the rate is not limited.
+    b_as_completed : bool, default=False
+        If False, return the results in the order of the problems, when all of
+        them are finished. If True, return a generator of (index, result)
+        pairs, with index the position of the problem in problems, in the
+        order in which they finish.
+    wire_format : str, {"json", "binary"}, default="json"
+        Format of the arrays in the requests, see `solve_index_tracking`. It
+        is used for the problems that do not set their own.
+    polling_policy : iq.api.iqrestapi.PollingPolicy, optional, default=None
+        Time between polls of the running computations. Defaults to the
+        polling_policy setting of the client of every problem.
+    timeout : float, optional, default=None
+        Maximum time to wait for every computation, in seconds. Defaults to
+        `iqrestapi.API_timeout`.
+    client : iq.api.iqrestapi.IQClient, optional, default=None
+        Client of the API used for the problems that do not set their own, see
+        `solve_index_tracking`. Problems with clients of different API keys
+        are solved concurrently, each one with its own credentials.
+
+    Returns
+    -------
+    results : list of tuple or generator of (int, tuple)
+        Results (optimal_portfolio, status, error_description) of
+        `solve_index_tracking` of every problem. A problem that fails to be
+        submitted or polled has status "Failed" and does not stop the rest.
+
+    """
+    results = _iterate_index_tracking_batch(
+        list(problems), max_in_flight, max_requests_per_second, wire_format,
+        polling_policy, iqrestapi.API_timeout if timeout is None else timeout,
+        iqrestapi.get_default_client() if client is None else client
+    )
+    if b_as_completed:
+        return results
+
+    ordered_results = [None] * len(problems)
+    for index, result in results:
+        ordered_results[index] = result
+    return ordered_results
+
+
+async def solve_index_tracking_async(*args, client=None, waittime=None, **kwdargs):
+    """Asyncio counterpart of `solve_index_tracking`.
+
+    It takes the same arguments. The validation and the serialization of the
+    problem run in a worker thread, and the submission and the polling of the
+    computation are awaited, so that the event loop is not blocked. Cancelling
+    the task stops waiting for the computation.
+
+    Parameters
+    ----------
+    *args, **kwdargs
+        Arguments of `solve_index_tracking`.
+    client : iq.api.aioiqrestapi.AsyncClient, optional, default=None
+        Client whose connection pool is used. If None, a client is opened and
+        closed for this problem.
+    waittime : float, optional, default=None
+        Time before the first poll of the computation, in seconds. Defaults to
+        the polling policy of the client, see `iqrestapi.PollingPolicy`.
+
+    Returns
+    -------
+    optimal_portfolio : dict
+    status : str
+    error_description : str
+
+    """
+    from iq.api import aioiqrestapi
+
+    problem = inspect.signature(solve_index_tracking).bind(*args, **kwdargs).arguments
+    if problem.get("backend", "remote") != "remote":
+        return await asyncio.to_thread(solve_index_tracking, **problem)
+
+    result, json_args = await asyncio.to_thread(_prepare_index_tracking, problem, problem.get("wire_format", "json"))
+    if json_args is None:
+        return result
+
+    if client is None:
+        async with aioiqrestapi.AsyncClient() as client:
+            r_post = await client.post(_INDEX_TRACKING_FUNCTION, waittime, json=json_args)
+    else:
+        r_post = await client.post(_INDEX_TRACKING_FUNCTION, waittime, json=json_args)
+    return _result_from_response(r_post)
+
+
+def _iterate_index_tracking_batch(problems, max_in_flight, max_requests_per_second, wire_format, polling_policy, timeout, client):
+    rate_limiter = iqrestapi.RateLimiter(max_requests_per_second) if max_requests_per_second else None
+    next_problems = iter(enumerate(problems))
+    b_all_problems_started = False
+    # Uploads that are running, and computations that are running in the API.
+    submissions = {}
+    computations = {}
+
+    with concurrent.futures.ThreadPoolExecutor(max_in_flight) as executor:
+        while True:
+            while not b_all_problems_started and len(submissions) + len(computations) < max_in_flight:
+                try:
+                    index, problem = next(next_problems)
+                except StopIteration:
+                    b_all_problems_started = True
+                    break
+                problem_client = problem.get("client") or client
+                future = executor.submit(_submit_index_tracking, problem, wire_format, rate_limiter, problem_client)
+                submissions[future] = index, problem_client
+
+            if not submissions and not computations:
+                return
+
+            for future in [future for future in submissions if future.done()]:
+                index, problem_client = submissions.pop(future)
+                try:
+                    response = future.result()
+                except Exception as error:
+                    yield index, ({"No assets": -1.0}, "Failed", "Submission: " + repr(error))
+                    continue
+                if isinstance(response, tuple):
+                    yield index, response
+                else:
+                    problem_polling_policy = problem_client.setting("polling_policy") if polling_policy is None else polling_policy
+                    schedule = problem_polling_policy.schedule(response)
+                    computations[index] = (
+                        response["computationId"], time.monotonic(), problem_client, schedule, time.monotonic() + schedule.interval
+                    )
+
+            # Keyed by index: clients of different APIs may repeat computation ids.
+            for index, (computation_id, start_time, problem_client, schedule, poll_time) in list(computations.items()):
+                if time.monotonic() < poll_time:
+                    continue
+                if rate_limiter is not None:
+                    rate_limiter.acquire()
+                try:
+                    body, retry_after = problem_client._get_computation(_INDEX_TRACKING_FUNCTION, computation_id)
+                except Exception as error:
+                    del computations[index]
+                    # Not reattached again, see `iqrestapi.ComputationJournal`.
+                    problem_client._finish(computation_id, {"status": "Failed"})
+                    yield index, ({"No assets": -1.0}, "Failed", "Polling: " + repr(error))
+                    continue
+                if iqrestapi.is_finished(body):
+                    del computations[index]
+                    yield index, _result_from_response(body)
+                elif time.monotonic() - start_time > timeout:
+                    del computations[index]
+                    problem_client._finish(computation_id, {"status": "Failed"})
+                    yield index, ({"No assets": -1.0}, "Failed", f"Exceeded maximum time to complete the computation {computation_id}. Maximum time: {timeout / 3600:2.1f}h")
+                else:
+                    schedule.update(body, retry_after)
+                    computations[index] = (computation_id, start_time, problem_client, schedule, time.monotonic() + schedule.interval)
+
+            # Wait for the next poll, or earlier if an upload finishes.
+            waiting_time = None
+            if computations:
+                waiting_time = max(min(computation[4] for computation in computations.values()) - time.monotonic(), 0)
+            if submissions:
+                concurrent.futures.wait(submissions, timeout=waiting_time, return_when=concurrent.futures.FIRST_COMPLETED)
+            elif computations:
+                time.sleep(waiting_time)
+
+
+def _submit_index_tracking(problem, wire_format, rate_limiter, client):
+    """Validate and submit a problem of solve_index_tracking_batch. Returns
+    either the result of solve_index_tracking, if it finished or failed
+    without running in the API, or the response of the API with the
+    computationId."""
+    if problem.get("backend", "remote") != "remote":
+        return solve_index_tracking(**({"wire_format": wire_format} | problem))
+
+    result, json_args = _prepare_index_tracking(problem, wire_format)
+    if json_args is None:
+        return result
+
+    if rate_limiter is not None:
+        rate_limiter.acquire()
+    body = client.submit(_INDEX_TRACKING_FUNCTION, json=json_args)
+    if not body.get("status", False) or iqrestapi.is_finished(body):
+        return _result_from_response(body)
+    return body
+
+
+def _prepare_index_tracking(problem, wire_format):
+    """Run the local validation of solve_index_tracking on the arguments in
+    problem without sending them to the API. Returns the result of
+    solve_index_tracking and None if it finished or failed locally, or None
+    and the request payload, encoded in the wire format, otherwise."""
+    payloads = []
+
+    def capture(json_args):
+        payloads.append(json_args)
+        return {"named_solution": {}, "status": "Submitted"}
+
+    problem = {"wire_format": wire_format} | problem | {"backend": capture}
+    result = solve_index_tracking(**problem)
+    if not payloads:
+        return result, None
+    return None, _encode_payload(payloads[0], problem["wire_format"])
+
+
+def _result_from_response(r_post):
+    """Result of solve_index_tracking from a response of the API."""
+    return r_post.get("named_solution", {"No assets": -1.0}), r_post["status"], r_post.get("error_description")
+
+
+def _encode_payload(json_args, wire_format):
+    """Request payload with its arrays in the wire format."""
+    return {
+        key: _encode_array(value, wire_format, b_symmetric=key == "assets_utility_matrix")
+        if isinstance(value, np.ndarray) else value
+        for key, value in json_args.items()
+    }
+
+
+def _encode_array(A, wire_format, b_symmetric=False):
+    """Array A in the wire format of the request."""
+    if wire_format == "binary":
+        return encoding.encode_array(A, b_symmetric)
+    return A.tolist()
+
+
+_INDEX_TRACKING_FUNCTION = "v1/iq-finance/index-tracking"
+
+
+def _solve_remotely(json_args, client=None):
+    return (iqrestapi if client is None else client).post(
+        _INDEX_TRACKING_FUNCTION,
         json= json_args,
     )
-    if "error_description" in r_post:
-        error_description = r_post["error_description"]
-    return r_post["named_solution"], r_post["status"], error_description
\ No newline at end of file
+
+
+# Solvers of solve_index_tracking. They take the request payload and return the
+# response of the API.
+BACKENDS = {
+    "remote": _solve_remotely,
+    "local": population_annealing.solve_index_tracking_locally,
+}
@@ -0,0 +1,269 @@
+import collections
+import concurrent.futures
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from iq.api import iqrestapi, validate
+from .index_tracking import solve_index_tracking
+
+__all__ = ["IndexTrackingCache"]
+
+
+class IndexTrackingCache:
+    """Cache of the results of `solve_index_tracking`.
+
+    The result of a problem only depends on its data: the matrices, the
+    constraints, the backend and the random_number_generator_seed. The cache
+    stores the successful results by a hash of all of them, so that solving the
+    same problem again returns the stored result without validating,
+    serializing or sending the problem. The description, and the arguments that
+    only change how the problem is checked or sent, e.g. validation or
+    wire_format, are not part of the hash. The results of the remote backend
+    are also stored by the base URL of the client, so that different
+    environments of the API, e.g. staging and production, do not share them.
+
+    The results are kept in memory, and optionally in a directory that several
+    processes can share, one JSON file per result. Results older than
+    time_to_live are discarded, and the least recently used results are removed
+    when a tier exceeds its limits. Identical problems that are solved at the
+    same time from several threads share a single computation.
+
+    Problems with a callable backend are not cached, because their result
+    depends on the state of the callable.
+
+    Parameters
+    ----------
+    directory : str or os.PathLike, optional, default=None
+        Directory of the disk tier. It is created if it does not exist. If
+        None, the results are only kept in memory.
+    time_to_live : float, optional, default=None
+        Maximum age of the results, in seconds. If None, they do not expire.
+    max_memory_entries : int, default=256
+        Maximum number of results in memory.
+    max_size : int, default=100 MiB
+        Maximum number of bytes of the results in the directory.
+    max_entries : int, optional, default=None
+        Maximum number of results in the directory.
+
+    """
+
+    def __init__(self, directory=None, time_to_live=None, max_memory_entries=256, max_size=100 * 2**20, max_entries=None):
+        self.directory = None if directory is None else os.fspath(directory)
+        self.time_to_live = time_to_live
+        self.max_memory_entries = max_memory_entries
+        self.max_size = max_size
+        self.max_entries = max_entries
+        self._memory = collections.OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def solve_index_tracking(self, *args, **kwdargs):
+        """Same as `iq.finance.index_tracking.solve_index_tracking`, but the
+        result is read from the cache if the problem was already solved."""
+        arguments = _signature.bind(*args, **kwdargs)
+        arguments.apply_defaults()
+        arguments = arguments.arguments
+        if callable(arguments["backend"]):
+            return solve_index_tracking(**arguments)
+
+        key = self.key(**arguments)
+        with self._lock:
+            result = self._get_from_memory(key)
+            if result is not None:
+                return _copy(result)
+            future = self._in_flight.get(key)
+            b_is_owner = future is None
+            if b_is_owner:
+                future = concurrent.futures.Future()
+                self._in_flight[key] = future
+        if not b_is_owner:
+            return _copy(future.result())
+
+        try:
+            result = self._get_from_directory(key)
+            if result is None:
+                result = solve_index_tracking(**arguments)
+                if result[1] == "Ok":
+                    self.put(key, result)
+            future.set_result(result)
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+        return _copy(result)
+
+    @staticmethod
+    def key(**arguments):
+        """Hash of the arguments of `solve_index_tracking` that change its result."""
+        hasher = hashlib.blake2b(digest_size=20)
+        for name in sorted(arguments):
+            if name not in _ignored_arguments:
+                hasher.update(name.encode())
+                _update_hash(hasher, arguments[name])
+        if arguments.get("backend", "remote") == "remote":
+            client = arguments.get("client") or iqrestapi.get_default_client()
+            hasher.update(b"base_url")
+            _update_hash(hasher, client.base_url)
+        return hasher.hexdigest()
+
+    def get(self, key):
+        """Cached result for `key`, or None if it is not in the cache."""
+        with self._lock:
+            result = self._get_from_memory(key)
+        if result is None:
+            result = self._get_from_directory(key)
+        return None if result is None else _copy(result)
+
+    def put(self, key, result):
+        """Store a result of `solve_index_tracking` under `key`."""
+        creation_time = time.time()
+        with self._lock:
+            self._put_in_memory(key, result, creation_time)
+        if self.directory is None:
+            return
+        path = os.path.join(self.directory, key + ".json")
+        temporary_path = os.path.join(self.directory, f".tmp-{key}-{os.getpid()}-{uuid.uuid4().hex}")
+        try:
+            with open(temporary_path, "w") as file:
+                json.dump({"creation_time": creation_time, "result": list(result)}, file)
+            os.replace(temporary_path, path)
+        finally:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+        self.evict()
+
+    def evict(self):
+        """Remove the expired results and the least recently used results of the
+        directory until it is within its limits."""
+        if self.directory is None:
+            return
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if name.startswith(".tmp-"):
+                # Leftovers of writers that died more than a day ago.
+                if stat.st_mtime < time.time() - 24 * 3600:
+                    _remove(path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total_size = sum(size for _, size, _ in entries)
+        num_entries = len(entries)
+        for _, size, path in entries:
+            b_too_large = total_size > self.max_size
+            b_too_many = self.max_entries is not None and num_entries > self.max_entries
+            if not (b_too_large or b_too_many):
+                break
+            _remove(path)
+            total_size -= size
+            num_entries -= 1
+
+    def clear(self):
+        """Remove all the results of the cache."""
+        with self._lock:
+            self._memory.clear()
+        if self.directory is not None:
+            for name in os.listdir(self.directory):
+                _remove(os.path.join(self.directory, name))
+
+    def _get_from_memory(self, key):
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        creation_time, result = entry
+        if self._is_expired(creation_time):
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return result
+
+    def _put_in_memory(self, key, result, creation_time):
+        self._memory[key] = (creation_time, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _get_from_directory(self, key):
+        if self.directory is None:
+            return None
+        path = os.path.join(self.directory, key + ".json")
+        try:
+            with open(path) as file:
+                entry = json.load(file)
+        except (FileNotFoundError, ValueError):
+            # Missing, or removed by another process while reading it.
+            return None
+        if self._is_expired(entry["creation_time"]):
+            _remove(path)
+            return None
+        try:
+            # Mark the result as recently used.
+            os.utime(path)
+        except OSError:
+            pass
+        result = tuple(entry["result"])
+        with self._lock:
+            self._put_in_memory(key, result, entry["creation_time"])
+        return result
+
+    def _is_expired(self, creation_time):
+        return self.time_to_live is not None and time.time() - creation_time > self.time_to_live
+
+
+_signature = inspect.signature(solve_index_tracking)
+# Arguments of solve_index_tracking that do not change a successful result.
+_ignored_arguments = {
+    "description", "validation", "assets_utility_matrix_certificate", "wire_format", "feasibility_check", "client",
+}
+
+
+def _update_hash(hasher, value):
+    """Add a canonical representation of an argument of solve_index_tracking
+    to hasher, with the numeric arrays as their float64 bytes."""
+    if validate.is_sparse(value):
+        value = validate.densify(value)
+    if isinstance(value, dict):
+        hasher.update(b"{")
+        for key in sorted(value, key=str):
+            hasher.update(json.dumps(str(key)).encode())
+            _update_hash(hasher, value[key])
+        hasher.update(b"}")
+        return
+    if value is None or isinstance(value, (bool, str)):
+        hasher.update(json.dumps(value).encode())
+        return
+    A = np.asarray(value)
+    if A.dtype.kind in "biuf":
+        hasher.update(f"array{A.shape}".encode())
+        hasher.update(np.ascontiguousarray(A, dtype=np.double).view(np.uint8))
+    else:
+        hasher.update(json.dumps([str(element) for element in A.ravel()]).encode())
+
+
+def _copy(result):
+    # The portfolio is a dict, which the caller may modify.
+    optimal_portfolio, status, error_description = result
+    return dict(optimal_portfolio), status, error_description
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,490 @@
+import numpy as np
+
+from iq.api import encoding
+
+__all__ = ["PopulationAnnealingSolver", "solve_index_tracking_locally"]
+
+
+class PopulationAnnealingSolver:
+    """Local solver of the index tracking problem by population annealing.
+
+    It solves the same MIQP problem as the remote service, see
+    `iq.finance.index_tracking.solve_index_tracking`, minimizing the tracking
+    error, up to the constant Var(r_I),
+
+        TE**2 - Var(r_I) = w @ assets_utility_matrix @ w - 2 assets_to_benchmark_utility_vector @ w
+
+    A population of replicas, each one a set of portfolio_size assets with
+    their weights, is annealed from a high to a low temperature. At every
+    temperature the replicas are resampled with their Boltzmann weights and
+    then updated with Metropolis moves that swap one asset of the portfolio by
+    another one, chosen preferably along the gradient of the tracking error.
+    The weights of every portfolio are optimized with a projected gradient
+    method on the box and budget constraints, and an augmented Lagrangian for
+    the linear, sectorial and maximum sales rotation constraints. The maximum
+    companies rotation constraint depends only on the assets, and enters the
+    energy of the replicas as a penalty. All the replicas are updated at once
+    with vectorized NumPy operations.
+
+    Instances are callables that take the request payload of the remote
+    service and return its response, so they can be passed as the `backend`
+    of `solve_index_tracking`.
+
+    Parameters
+    ----------
+    num_replicas : int, default=64
+        Size of the population.
+    num_temperatures : int, default=40
+        Number of temperatures of the annealing schedule.
+    num_sweeps : int, default=4
+        Number of swap moves per replica at every temperature.
+    num_inner_iterations : int, default=20
+        Number of gradient iterations on the weights after every swap move.
+    num_polish_iterations : int, default=3000
+        Number of gradient iterations on the weights of the best portfolios at
+        the end of the annealing.
+    num_polished_portfolios : int, default=8
+        Number of best distinct portfolios that are polished.
+    tolerance : float, default=1e-6
+        Maximum violation of the constraints of a feasible solution.
+
+    """
+
+    def __init__(
+        self,
+        num_replicas=64,
+        num_temperatures=40,
+        num_sweeps=4,
+        num_inner_iterations=20,
+        num_polish_iterations=3000,
+        num_polished_portfolios=8,
+        tolerance=1e-6
+    ):
+        self.num_replicas = num_replicas
+        self.num_temperatures = num_temperatures
+        self.num_sweeps = num_sweeps
+        self.num_inner_iterations = num_inner_iterations
+        self.num_polish_iterations = num_polish_iterations
+        self.num_polished_portfolios = num_polished_portfolios
+        self.tolerance = tolerance
+
+    def __call__(self, payload):
+        """Solve the index tracking problem of a request payload.
+
+        Parameters
+        ----------
+        payload : dict
+            Request of the remote service, with the arrays either as NumPy
+            arrays, nested lists or encoded by `iq.api.encoding.encode_array`.
+
+        Returns
+        -------
+        response : dict
+            {"named_solution": dict, "status": "Ok" | "Failed", "cost": float}
+            plus "error_description" if the solver failed.
+
+        """
+        try:
+            problem = _parse_payload(payload)
+        except Exception as error:
+            return _failed("Validation: " + repr(error))
+
+        num_assets = problem["assets_utility_matrix"].shape[0]
+        portfolio_size = problem["portfolio_size"]
+        if portfolio_size <= 0 or portfolio_size > num_assets:
+            return _failed(f"Feasibility: Portfolio_size={portfolio_size} is not valid. It must be in the range: 0 < portfolio_size <= {num_assets}, with {num_assets} the number of assets without missing data.")
+        if not (
+            portfolio_size * problem["minimum_weight"] <= problem["sum_of_portfolio_weights"]
+            <= portfolio_size * problem["maximum_weight"]
+        ):
+            return _failed(f"Feasibility: {portfolio_size} weights between {problem['minimum_weight']} and {problem['maximum_weight']} cannot sum {problem['sum_of_portfolio_weights']}.")
+
+        ix_support, weights, violation = self.minimize(problem)
+        if violation > self.tolerance:
+            return _failed(f"Feasibility: No portfolio that satisfies all the constraints was found. The lowest maximum violation of the constraints is {violation}.")
+
+        utility_matrix = problem["assets_utility_matrix"][np.ix_(ix_support, ix_support)]
+        cost = weights @ utility_matrix @ weights - 2 * problem["assets_to_benchmark_utility_vector"][ix_support] @ weights
+        ix_order = np.argsort(ix_support)
+        return {
+            "named_solution": {
+                problem["asset_names"][ix_support[i]]: float(weights[i]) for i in ix_order
+            },
+            "status": "Ok",
+            "cost": float(cost),
+        }
+
+    def minimize(self, problem):
+        """Anneal the population and polish its best portfolios.
+
+        Returns
+        -------
+        ix_support : np.ndarray[(portfolio_size,), dtype=int]
+            Assets of the best portfolio.
+        weights : np.ndarray[(portfolio_size,), dtype=np.double]
+            Weights of the assets of the best portfolio.
+        violation : float
+            Maximum violation of the constraints by the best portfolio.
+
+        """
+        rng = np.random.default_rng(problem["random_number_generator_seed"])
+        energy_function = _EnergyFunction(problem)
+        num_assets = energy_function.num_assets
+        portfolio_size = problem["portfolio_size"]
+
+        # Random initial portfolios with equal weights. If there is a previous
+        # portfolio, a quarter of the replicas start from its largest weights,
+        # since the rotation constraints keep the solution close to it.
+        ix_support = np.argsort(rng.random((self.num_replicas, num_assets)), axis=1)[:, :portfolio_size]
+        weights = np.zeros((self.num_replicas, portfolio_size))
+        num_previous_assets = min(np.count_nonzero(energy_function.previous_weights), portfolio_size)
+        if num_previous_assets > 0:
+            ix_previous_assets = np.argsort(-np.abs(energy_function.previous_weights))[:num_previous_assets]
+            num_previous_replicas = max(self.num_replicas // 4, 1)
+            ix_previous_support = ix_support[:num_previous_replicas]
+            for i in range(num_previous_replicas):
+                ix_others = np.setdiff1d(ix_previous_support[i], ix_previous_assets)[:portfolio_size - num_previous_assets]
+                if ix_others.size < portfolio_size - num_previous_assets:
+                    ix_others = np.setdiff1d(np.arange(num_assets), ix_previous_assets)[:portfolio_size - num_previous_assets]
+                ix_previous_support[i] = np.concatenate((ix_previous_assets, ix_others))
+            weights[:num_previous_replicas] = energy_function.previous_weights[ix_previous_support]
+        weights = energy_function.project(weights)
+        multipliers = energy_function.initial_multipliers(self.num_replicas)
+        weights, multipliers = energy_function.minimize_weights(
+            ix_support, weights, multipliers, 5 * self.num_inner_iterations
+        )
+        energy = energy_function.energy(ix_support, weights)
+
+        previous_beta = 0.0
+        for beta in np.geomspace(1.0, 1e4, self.num_temperatures):
+            # Resample the population with the Boltzmann weights of the
+            # temperature change.
+            boltzmann_weights = np.exp(-(beta - previous_beta) * (energy - energy.min()))
+            cumulative_weights = np.cumsum(boltzmann_weights)
+            ix_replicas = np.searchsorted(
+                cumulative_weights,
+                (rng.random() + np.arange(self.num_replicas)) * cumulative_weights[-1] / self.num_replicas
+            )
+            ix_replicas = np.minimum(ix_replicas, self.num_replicas - 1)
+            ix_support = ix_support[ix_replicas]
+            weights = weights[ix_replicas]
+            multipliers = multipliers[ix_replicas]
+            energy = energy[ix_replicas]
+
+            for _ in range(self.num_sweeps):
+                weights, multipliers = energy_function.minimize_weights(
+                    ix_support, weights, multipliers, self.num_inner_iterations
+                )
+                energy = energy_function.energy(ix_support, weights)
+
+                proposed_ix_support = energy_function.propose_swaps(ix_support, weights, rng)
+                proposed_weights, proposed_multipliers = energy_function.minimize_weights(
+                    proposed_ix_support, weights, multipliers, self.num_inner_iterations
+                )
+                proposed_energy = energy_function.energy(proposed_ix_support, proposed_weights)
+
+                b_accepted = rng.random(self.num_replicas) < np.exp(-beta * np.maximum(proposed_energy - energy, 0))
+                ix_support = np.where(b_accepted[:, None], proposed_ix_support, ix_support)
+                weights = np.where(b_accepted[:, None], proposed_weights, weights)
+                multipliers = np.where(b_accepted[:, None], proposed_multipliers, multipliers)
+                energy = np.where(b_accepted, proposed_energy, energy)
+            previous_beta = beta
+
+        # Polish the weights of the best distinct portfolios.
+        ix_best = np.argsort(energy)
+        _, ix_unique = np.unique(np.sort(ix_support[ix_best], axis=1), axis=0, return_index=True)
+        ix_best = ix_best[np.sort(ix_unique)[:self.num_polished_portfolios]]
+        ix_support = ix_support[ix_best]
+        weights = weights[ix_best]
+        multipliers = multipliers[ix_best]
+        weights, multipliers = energy_function.minimize_weights(
+            ix_support, weights, multipliers, self.num_inner_iterations,
+            num_multiplier_updates=self.num_polish_iterations // self.num_inner_iterations
+        )
+        objective = energy_function.objective(ix_support, weights)
+        violation = energy_function.violation(ix_support, weights)
+
+        b_feasible = violation <= self.tolerance
+        if np.any(b_feasible):
+            ix_solution = np.flatnonzero(b_feasible)[np.argmin(objective[b_feasible])]
+        else:
+            ix_solution = np.argmin(violation)
+        return ix_support[ix_solution], weights[ix_solution], violation[ix_solution]
+
+
+def solve_index_tracking_locally(payload):
+    """Solve the request payload of the index tracking service with a
+    `PopulationAnnealingSolver` with the default parameters."""
+    return PopulationAnnealingSolver()(payload)
+
+
+class _EnergyFunction:
+    """Objective, constraints and weight optimization of a population of
+    portfolios, given by the indices of their assets, ix_support, and their
+    weights, both with shape (num_replicas, portfolio_size). The utilities are
+    normalized by their mean variance, so that the temperatures and penalties
+    do not depend on the scale of the returns."""
+
+    # Penalty of the energy per unit of violation of the constraints.
+    PENALTY = 100.0
+    # Penalty parameter of the augmented Lagrangian.
+    RHO = 10.0
+
+    def __init__(self, problem):
+        utility_matrix = problem["assets_utility_matrix"]
+        self.scale = np.mean(np.abs(np.diag(utility_matrix)))
+        if not self.scale > 0:
+            self.scale = 1.0
+        self.utility_matrix = utility_matrix / self.scale
+        self.utility_vector = problem["assets_to_benchmark_utility_vector"] / self.scale
+        self.num_assets = utility_matrix.shape[0]
+        self.portfolio_size = problem["portfolio_size"]
+        self.minimum_weight = problem["minimum_weight"]
+        self.maximum_weight = problem["maximum_weight"]
+        self.sum_of_portfolio_weights = problem["sum_of_portfolio_weights"]
+
+        self.linear_constraints_matrix = problem["linear_constraints_matrix"]
+        self.lower_bounds_vector = problem["lower_bounds_vector"]
+        self.upper_bounds_vector = problem["upper_bounds_vector"]
+        self.num_linear_constraints = self.linear_constraints_matrix.shape[0]
+
+        self.previous_weights = problem["previous_weights"]
+        self.b_previous_asset = self.previous_weights != 0
+        self.total_previous_weight = problem["total_previous_weight"]
+        self.num_previous_assets = problem["num_previous_assets"]
+        self.max_sales_rotation = problem["max_sales_rotation"]
+        self.max_companies_rotation = problem["max_companies_rotation"]
+        self.b_sales_rotation = self.max_sales_rotation >= 0
+        self.b_companies_rotation = self.max_companies_rotation >= 0
+
+    def initial_multipliers(self, num_replicas):
+        return np.zeros((num_replicas, 2 * self.num_linear_constraints + self.b_sales_rotation))
+
+    def objective(self, ix_support, weights):
+        utility_matrices = self.utility_matrix[ix_support[:, :, None], ix_support[:, None, :]]
+        return (
+            np.einsum('rk,rk->r', (utility_matrices @ weights[:, :, None])[:, :, 0], weights)
+            - 2 * np.einsum('rk,rk->r', self.utility_vector[ix_support], weights)
+        )
+
+    def constraints(self, ix_support, weights):
+        """Constraints of the weights, in the form constraints <= 0."""
+        linear_constraints = np.einsum(
+            'mrk,rk->rm', self.linear_constraints_matrix[:, ix_support], weights
+        )
+        constraints = [
+            self.lower_bounds_vector - linear_constraints,
+            linear_constraints - self.upper_bounds_vector
+        ]
+        if self.b_sales_rotation:
+            constraints.append(self._sales_rotation(ix_support, weights)[:, None] - self.max_sales_rotation)
+        return np.concatenate(constraints, axis=1)
+
+    def companies_rotation_excess(self, ix_support):
+        if not self.b_companies_rotation:
+            return np.zeros(ix_support.shape[0])
+        num_sold_companies = self.num_previous_assets - np.sum(self.b_previous_asset[ix_support], axis=1)
+        return np.maximum(num_sold_companies - self.max_companies_rotation, 0)
+
+    def violation(self, ix_support, weights):
+        """Maximum violation of the constraints."""
+        violation = self.companies_rotation_excess(ix_support)
+        constraints = self.constraints(ix_support, weights)
+        if constraints.shape[1] > 0:
+            violation = np.maximum(violation, np.max(constraints, axis=1, initial=0.0))
+        return violation
+
+    def energy(self, ix_support, weights):
+        constraints = self.constraints(ix_support, weights)
+        return (
+            self.objective(ix_support, weights)
+            + self.PENALTY * np.sum(np.maximum(constraints, 0), axis=1)
+            + self.PENALTY * self.companies_rotation_excess(ix_support)
+        )
+
+    def project(self, weights):
+        """Euclidean projection of every row of weights on
+        minimum_weight <= weights <= maximum_weight, sum(weights) = sum_of_portfolio_weights.
+
+        The projection is np.clip(weights - shift, minimum_weight, maximum_weight),
+        whose sum is piecewise linear and decreasing in the shift, with
+        breakpoints at weights - maximum_weight, where an element leaves the
+        upper bound, and weights - minimum_weight, where it reaches the lower
+        bound. The sums at the sorted breakpoints follow from the cumulative
+        number of elements between the bounds, and the shift is interpolated
+        between the breakpoints around sum_of_portfolio_weights.
+        """
+        num_replicas, portfolio_size = weights.shape
+        breakpoints = np.concatenate((weights - self.maximum_weight, weights - self.minimum_weight), axis=1)
+        slope_changes = np.concatenate(
+            (np.ones((num_replicas, portfolio_size)), -np.ones((num_replicas, portfolio_size))), axis=1
+        )
+        ix_sorted = np.argsort(breakpoints, axis=1)
+        breakpoints = np.take_along_axis(breakpoints, ix_sorted, axis=1)
+        num_elements_between_bounds = np.cumsum(np.take_along_axis(slope_changes, ix_sorted, axis=1), axis=1)
+        sums = portfolio_size * self.maximum_weight - np.concatenate(
+            (
+                np.zeros((num_replicas, 1)),
+                np.cumsum(num_elements_between_bounds[:, :-1] * np.diff(breakpoints, axis=1), axis=1)
+            ),
+            axis=1
+        )
+
+        ix_replicas = np.arange(num_replicas)
+        ix_breakpoints = np.clip(
+            np.sum(sums >= self.sum_of_portfolio_weights, axis=1) - 1, 0, breakpoints.shape[1] - 2
+        )
+        sum_left = sums[ix_replicas, ix_breakpoints]
+        sum_right = sums[ix_replicas, ix_breakpoints + 1]
+        shift_left = breakpoints[ix_replicas, ix_breakpoints]
+        shift_right = breakpoints[ix_replicas, ix_breakpoints + 1]
+        slope = np.where(sum_left > sum_right, (shift_right - shift_left) / np.maximum(sum_left - sum_right, 1e-300), 0)
+        shift = shift_left + (sum_left - self.sum_of_portfolio_weights) * slope
+        return np.clip(weights - shift[:, None], self.minimum_weight, self.maximum_weight)
+
+    def minimize_weights(self, ix_support, weights, multipliers, num_iterations, num_multiplier_updates=1):
+        """num_multiplier_updates times, num_iterations projected gradient
+        iterations on the augmented Lagrangian of the constraints, followed by
+        an update of the Lagrange multipliers."""
+        utility_matrices = self.utility_matrix[ix_support[:, :, None], ix_support[:, None, :]]
+        utility_vectors = self.utility_vector[ix_support]
+        linear_constraints_matrices = self.linear_constraints_matrix[:, ix_support]
+        previous_weights = self.previous_weights[ix_support]
+
+        # Upper bound of the Lipschitz constant of the gradient.
+        lipschitz_constants = (
+            2 * np.max(np.sum(np.abs(utility_matrices), axis=2), axis=1)
+            + 2 * self.RHO * np.sum(linear_constraints_matrices**2, axis=(0, 2))
+            + self.RHO * self.b_sales_rotation * self.portfolio_size / 4
+        )
+        step_sizes = 1 / lipschitz_constants[:, None]
+
+        num_linear_constraints = self.num_linear_constraints
+        for _ in range(num_multiplier_updates):
+            for _ in range(num_iterations):
+                gradient = (
+                    2 * (utility_matrices @ weights[:, :, None])[:, :, 0] - 2 * utility_vectors
+                )
+                if multipliers.shape[1] > 0:
+                    constraints = self.constraints(ix_support, weights)
+                    penalties = np.maximum(self.RHO * constraints + multipliers, 0)
+                    gradient += np.einsum(
+                        'mrk,rm->rk', linear_constraints_matrices,
+                        penalties[:, num_linear_constraints:2 * num_linear_constraints] - penalties[:, :num_linear_constraints]
+                    )
+                    if self.b_sales_rotation:
+                        gradient += penalties[:, -1:] * np.sign(weights - previous_weights) / 2
+                weights = self.project(weights - step_sizes * gradient)
+
+            if multipliers.shape[1] > 0:
+                multipliers = np.maximum(multipliers + self.RHO * self.constraints(ix_support, weights), 0)
+        return weights, multipliers
+
+    def propose_swaps(self, ix_support, weights, rng):
+        """Replace one asset of every portfolio by another one. Assets with
+        small weights are removed more likely, and assets along the descent
+        direction of the objective are added more likely."""
+        num_replicas = ix_support.shape[0]
+        ix_replicas = np.arange(num_replicas)
+
+        gradient = (
+            2 * np.einsum('rkn,rk->rn', self.utility_matrix[ix_support], weights)
+            - 2 * self.utility_vector
+        )
+        gradient /= np.std(gradient, axis=1, keepdims=True) + 1e-300
+        scores = -gradient + rng.gumbel(size=gradient.shape)
+        scores[ix_replicas[:, None], ix_support] = -np.inf
+        ix_added = np.argmax(scores, axis=1)
+
+        scores = -weights / (np.mean(np.abs(weights), axis=1, keepdims=True) + 1e-300)
+        ix_removed = np.argmax(scores + rng.gumbel(size=weights.shape), axis=1)
+
+        proposed_ix_support = ix_support.copy()
+        proposed_ix_support[ix_replicas, ix_removed] = ix_added
+        return proposed_ix_support
+
+    def _sales_rotation(self, ix_support, weights):
+        previous_weights = self.previous_weights[ix_support]
+        return (
+            self.total_previous_weight
+            + np.sum(np.abs(previous_weights - weights) - np.abs(previous_weights), axis=1)
+        ) / 2
+
+
+def _parse_payload(payload):
+    """Arrays and numbers of a request payload, restricted to the assets
+    without missing data."""
+    payload = encoding.decode_payload(payload)
+    assets_utility_matrix = np.asarray(payload["assets_utility_matrix"], dtype=np.double)
+    asset_names = np.asarray(payload["asset_names"])
+    ix_of_assets_without_missing_data = np.flatnonzero(np.diag(assets_utility_matrix) != -1)
+
+    problem = {
+        "assets_utility_matrix": np.ascontiguousarray(
+            assets_utility_matrix[np.ix_(ix_of_assets_without_missing_data, ix_of_assets_without_missing_data)]
+        ),
+        "assets_to_benchmark_utility_vector": np.asarray(
+            payload["assets_to_benchmark_utility_vector"], dtype=np.double
+        )[ix_of_assets_without_missing_data],
+        "asset_names": asset_names[ix_of_assets_without_missing_data].tolist(),
+        "portfolio_size": int(payload["portfolio_size"]),
+        "minimum_weight": float(payload.get("minimum_weight", 0.0)),
+        "maximum_weight": float(payload.get("maximum_weight", 1.0)),
+        "sum_of_portfolio_weights": float(payload.get("sum_of_portfolio_weights", 1.0)),
+        "random_number_generator_seed": int(payload.get("random_number_generator_seed", 123321)),
+    }
+
+    # Linear constraints, including the sectorial ones.
+    num_assets = asset_names.size
+    linear_constraints_matrices = [np.zeros((0, num_assets))]
+    lower_bounds_vectors = [np.zeros(0)]
+    upper_bounds_vectors = [np.zeros(0)]
+    if payload.get("linear_constraints_matrix") is not None:
+        linear_constraints_matrix = np.asarray(payload["linear_constraints_matrix"], dtype=np.double)
+        num_linear_constraints = linear_constraints_matrix.shape[0]
+        linear_constraints_matrices.append(linear_constraints_matrix)
+        lower_bounds_vectors.append(_bounds_vector(payload.get("lower_bounds_vector"), num_linear_constraints, -np.inf))
+        upper_bounds_vectors.append(_bounds_vector(payload.get("upper_bounds_vector"), num_linear_constraints, np.inf))
+    if payload.get("sectorial_distribution") is not None:
+        from iq.finance.index_tracking import build_matrix_of_sector_restrictions
+        r, r_min = build_matrix_of_sector_restrictions(
+            asset_names, payload["sectorial_weights"], payload["sectorial_distribution"],
+            float(payload["sectorial_weight_tolerance"])
+        )
+        linear_constraints_matrices.append(r)
+        lower_bounds_vectors.append(r_min)
+        upper_bounds_vectors.append(np.full(r_min.size, np.inf))
+    problem["linear_constraints_matrix"] = np.ascontiguousarray(
+        np.concatenate(linear_constraints_matrices, axis=0)[:, ix_of_assets_without_missing_data]
+    )
+    problem["lower_bounds_vector"] = np.concatenate(lower_bounds_vectors)
+    problem["upper_bounds_vector"] = np.concatenate(upper_bounds_vectors)
+
+    # Rotation constraints. The weights of the previous portfolio in assets
+    # with missing data or not in the assets must be sold.
+    previous_portfolio = payload.get("previous_portfolio") or {}
+    ix_of_names = {name: i for i, name in enumerate(problem["asset_names"])}
+    previous_weights = np.zeros(ix_of_assets_without_missing_data.size)
+    for name, weight in previous_portfolio.items():
+        if name in ix_of_names:
+            previous_weights[ix_of_names[name]] = weight
+    previous_portfolio_weights = np.array(list(previous_portfolio.values()), dtype=np.double)
+    problem["previous_weights"] = previous_weights
+    problem["total_previous_weight"] = np.sum(np.abs(previous_portfolio_weights))
+    problem["num_previous_assets"] = np.count_nonzero(previous_portfolio_weights)
+    b_previous_portfolio = len(previous_portfolio) > 0
+    problem["max_companies_rotation"] = int(payload.get("max_companies_rotation", -1)) if b_previous_portfolio else -1
+    problem["max_sales_rotation"] = float(payload.get("max_sales_rotation", -1.0)) if b_previous_portfolio else -1.0
+    return problem
+
+
+def _bounds_vector(bounds_vector, size, default_bound):
+    if bounds_vector is None:
+        return np.full(size, default_bound)
+    bounds_vector = np.array(bounds_vector, dtype=np.double)
+    bounds_vector[np.isnan(bounds_vector)] = default_bound
+    return bounds_vector
+
+
+def _failed(error_description):
+    return {"named_solution": {"No assets": -1.0}, "status": "Failed", "error_description": error_description}
@@ -1 +1,3 @@
-from .quadratic_utility import *
\ No newline at end of file
+from .factor_model import *
+from .quadratic_utility import *
+from .quadratic_utility_cache import *
\ No newline at end of file
@@ -0,0 +1,174 @@
+import numpy as np
+
+__all__ = ["FactorModel"]
+
+
+class FactorModel:
+    """Low-rank plus diagonal representation of a quadratic utility matrix,
+
+        C = B @ B.T + np.diag(D)
+
+    with B the (n_assets, n_factors) matrix of factor loadings and D the vector
+    of idiosyncratic variances. With n_factors << n_assets, it only needs
+    O(n_assets * n_factors) memory, and the products with portfolios are
+    computed in O(n_assets * n_factors) time without building C.
+
+    Parameters
+    ----------
+    factor_loadings : np.ndarray[(n_assets, n_factors), dtype=np.double]
+        Matrix B of factor loadings.
+    idiosyncratic_variances : np.ndarray[(n_assets,), dtype=np.double]
+        Diagonal D added to the low-rank part. As in the dense matrices, an
+        asset without factor loadings and with -1 as its variance marks an
+        asset with missing data.
+
+    """
+
+    # NumPy operators with arrays, e.g. w @ C, return NotImplemented instead of
+    # converting C with __array__, so that they call __rmatmul__ and C is
+    # never built.
+    __array_ufunc__ = None
+
+    def __init__(self, factor_loadings, idiosyncratic_variances):
+        factor_loadings = np.asarray(factor_loadings, dtype=np.double)
+        idiosyncratic_variances = np.asarray(idiosyncratic_variances, dtype=np.double)
+        if factor_loadings.ndim != 2:
+            raise ValueError(f"The factor loadings must be a matrix. Got an array with shape {factor_loadings.shape}.")
+        if idiosyncratic_variances.shape != (factor_loadings.shape[0],):
+            raise ValueError(f"The idiosyncratic variances must be a vector with {factor_loadings.shape[0]} elements. Got an array with shape {idiosyncratic_variances.shape}.")
+        self.factor_loadings = factor_loadings
+        self.idiosyncratic_variances = idiosyncratic_variances
+
+    @property
+    def num_assets(self):
+        return self.factor_loadings.shape[0]
+
+    @property
+    def num_factors(self):
+        return self.factor_loadings.shape[1]
+
+    @property
+    def shape(self):
+        return (self.num_assets, self.num_assets)
+
+    @classmethod
+    def from_matrix(cls, matrix, num_factors, method="eigh", num_power_iterations=4, seed=0):
+        """Fit a factor model to a symmetric matrix.
+
+        The factors are the eigenvectors of the `num_factors` largest
+        eigenvalues, scaled by the square root of the eigenvalues, and the
+        idiosyncratic variances are the remainder of the diagonal, so that the
+        diagonal of the matrix is kept exactly. Negative remainders are set to 0.
+
+        Parameters
+        ----------
+        matrix : np.ndarray[(n_assets, n_assets), dtype=np.double]
+            Symmetric semidefinite positive matrix, e.g. a covariance matrix.
+        num_factors : int
+            Number of factors.
+        method : str, {"eigh", "randomized"}, default="eigh"
+            "eigh" computes all the eigenvalues, in O(n_assets**3) time.
+            "randomized" estimates the largest ones with a randomized subspace
+            iteration in O(n_assets**2 * n_factors) time.
+        num_power_iterations : int, default=4
+            Number of subspace iterations of the "randomized" method.
+        seed : int, default=0
+            Seed of the random starting subspace of the "randomized" method.
+
+        Returns
+        -------
+        factor_model : FactorModel
+
+        """
+        matrix = np.asarray(matrix, dtype=np.double)
+        if matrix.ndim != 2 or matrix.shape[0] != matrix.shape[1]:
+            raise ValueError(f"The matrix must be square. Got an array with shape {matrix.shape}.")
+        num_assets = matrix.shape[0]
+        num_factors = int(num_factors)
+        if num_factors < 0 or num_factors > num_assets:
+            raise ValueError(f"The number of factors: {num_factors} is out of range: (0, {num_assets})")
+
+        if method == "eigh":
+            eigenvalues, eigenvectors = np.linalg.eigh(matrix)
+            eigenvalues = eigenvalues[num_assets - num_factors:]
+            eigenvectors = eigenvectors[:, num_assets - num_factors:]
+        elif method == "randomized":
+            eigenvalues, eigenvectors = _randomized_largest_eigenpairs(
+                matrix, num_factors, num_power_iterations, seed
+            )
+        else:
+            raise ValueError(f"Method '{method}' is not valid. Possible values are 'eigh' or 'randomized'.")
+
+        factor_loadings = eigenvectors * np.sqrt(np.maximum(eigenvalues, 0))
+        idiosyncratic_variances = np.maximum(
+            np.diag(matrix) - np.einsum('ik,ik->i', factor_loadings, factor_loadings), 0
+        )
+        return cls(factor_loadings, idiosyncratic_variances)
+
+    def matvec(self, w):
+        """C @ w. `w` can be a vector or a matrix with one portfolio per column."""
+        w = np.asarray(w, dtype=np.double)
+        if w.ndim == 1:
+            return self.factor_loadings @ (self.factor_loadings.T @ w) + self.idiosyncratic_variances * w
+        return self.factor_loadings @ (self.factor_loadings.T @ w) + self.idiosyncratic_variances[:, None] * w
+
+    def __matmul__(self, w):
+        return self.matvec(w)
+
+    def __rmatmul__(self, w):
+        # C is symmetric, so w @ C = (C @ w.T).T
+        w = np.asarray(w, dtype=np.double)
+        return self.matvec(w.T).T
+
+    def quadratic_form(self, w):
+        """w @ C @ w. `w` can be a vector or a matrix with one portfolio per row,
+        in which case a vector with the value for each portfolio is returned."""
+        w = np.asarray(w, dtype=np.double)
+        factor_exposures = w @ self.factor_loadings
+        return (
+            np.sum(factor_exposures**2, axis=-1)
+            + np.sum(self.idiosyncratic_variances * w**2, axis=-1)
+        )
+
+    def diagonal(self):
+        """Diagonal elements of C."""
+        return np.einsum('ik,ik->i', self.factor_loadings, self.factor_loadings) + self.idiosyncratic_variances
+
+    def missing_data_mask(self):
+        """Boolean mask of the assets with missing data, which have no factor
+        loadings and -1 as their variance."""
+        return (self.idiosyncratic_variances == -1) & ~np.any(self.factor_loadings, axis=1)
+
+    def is_positive_semidefinite(self, tolerance=1e-7):
+        """B @ B.T is always semidefinite positive, so C is semidefinite positive
+        if the idiosyncratic variances are not negative. The assets with missing
+        data are not part of the problem and are not checked."""
+        b_checked = ~self.missing_data_mask()
+        return bool(np.all(self.idiosyncratic_variances[b_checked] >= -tolerance))
+
+    def to_dense(self):
+        """Dense (n_assets, n_assets) matrix C."""
+        dense = self.factor_loadings @ self.factor_loadings.T
+        dense.flat[::self.num_assets + 1] += self.idiosyncratic_variances
+        return dense
+
+    def __array__(self, dtype=None, copy=None):
+        dense = self.to_dense()
+        if dtype is not None:
+            dense = dense.astype(dtype, copy=False)
+        return dense
+
+
+def _randomized_largest_eigenpairs(matrix, num_factors, num_power_iterations, seed):
+    """Largest eigenpairs of a symmetric matrix by randomized subspace iteration."""
+    num_assets = matrix.shape[0]
+    # A few extra directions improve the accuracy of the last factors.
+    num_directions = min(num_assets, num_factors + 10)
+    rng = np.random.default_rng(seed)
+    subspace, _ = np.linalg.qr(matrix @ rng.standard_normal((num_assets, num_directions)))
+    for _ in range(num_power_iterations):
+        subspace, _ = np.linalg.qr(matrix @ subspace)
+    eigenvalues, eigenvectors = np.linalg.eigh(subspace.T @ matrix @ subspace)
+    eigenvalues = eigenvalues[num_directions - num_factors:]
+    eigenvectors = subspace @ eigenvectors[:, num_directions - num_factors:]
+    return eigenvalues, eigenvectors
@@ -1,6 +1,32 @@
-import pandas as pd
+from __future__ import annotations
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
 import numpy as np
 
+from .factor_model import FactorModel
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+__all__ = [
+    "compute_quadratic_utility",
+    "compute_covariance_matrix",
+    "compute_cumulative_returns_distance_matrix",
+    "compute_covariance_factor_model",
+    "compute_quadratic_utility_rolling",
+    "compute_quadratic_utility_multiple_halflives",
+    "compute_quadratic_utility_out_of_core",
+    "compute_EWMA_cost_function",
+    "compute_EWMA_cost_functions",
+    "CompactQuadraticUtility",
+    "EWMACostFunctionUpdater",
+    "QuadraticUtilityUpdater",
+]
+
 
 def compute_quadratic_utility(
     assets_index_prices : pd.DataFrame,
@@ -10,106 +36,36 @@ def compute_quadratic_utility(
     date_to : str | pd.Timestamp,
     EMWA_halflife : int = 252,
     maximum_missing_data_ratio_allowed : float = 0.0,
-    l2_regularization : float = 0.0
+    l2_regularization : float = 0.0,
+    engine : str = "einsum",
+    dtype : np.dtype = np.double,
+    executor = None,
+    b_return_compact : bool = False
 ):
-    if str_cost_function not in ["covariance", "quadratic_distance"]:
-        raise ValueError(f"Cost function '{str_cost_function}' is not valid. Possible values are 'covariance' or 'quadratic_distance'.")
-    
-    if benchmark_column not in assets_index_prices.columns:
-        raise ValueError(f"Benchmark column '{benchmark_column}' is not in the provided DataFrame.")
-    
-    # Move benchmark column to the last position
-    assets_index_prices = assets_index_prices[[col for col in assets_index_prices.columns if col != benchmark_column] + [benchmark_column]]
-    
-
-    # Make sure that the prices dataset is ordered from earliest (top row)
-    # to latest date (bottom row).
-    assets_index_prices = assets_index_prices.sort_index(ascending=True)
-    assets_index_prices = assets_index_prices.loc[date_from:date_to]
-
-    tickers = assets_index_prices.columns
-    num_samples = assets_index_prices.shape[0]
-    num_assets = assets_index_prices.shape[1] - 1
-
-    # Filter out tickers with more than some percentage of missing data.
-    if maximum_missing_data_ratio_allowed > 1 or maximum_missing_data_ratio_allowed < 0:
-        raise ValueError(f"The maximum ratio of allowed missing data: {maximum_missing_data_ratio_allowed} is out of bounds [0,1].")
-    missing_data_ratio_per_ticket = (
-        1 - assets_index_prices.count(axis=0) / num_samples
-    ).to_numpy()
-    ix_tickers_without_missing_data = np.where(
-        missing_data_ratio_per_ticket <= maximum_missing_data_ratio_allowed
-    )[0]
-    # Add to tickers without missing data any with the latest price removed.
-    if str_cost_function == "quadratic_distance":
-        np_latest_prices = assets_index_prices.iloc[-1].to_numpy()
-        b_any_price_in_lowest_row_is_nan = np.any(np.isnan(np_latest_prices))
-        if b_any_price_in_lowest_row_is_nan:
-            ix_tickers_with_nan = np.where(np.isnan(np_latest_prices))[0]
-            for ix_ticker in ix_tickers_with_nan:
-                if ix_ticker in ix_tickers_without_missing_data:
-                    ix_in_array = np.where(ix_tickers_without_missing_data == ix_ticker)
-                    ix_tickers_without_missing_data = np.delete(
-                        ix_tickers_without_missing_data, ix_in_array
-                    )
-    ix_tickers_with_missing_data = np.delete(
-        np.arange(num_assets + 1),
-        ix_tickers_without_missing_data
+    np_data, ix_tickers_without_missing_data, tickers = _prepare_data_points(
+        assets_index_prices, benchmark_column, str_cost_function,
+        date_from, date_to, maximum_missing_data_ratio_allowed
     )
-    # Remove assets with missing data.
-    assets_index_prices = assets_index_prices.iloc[:, ix_tickers_without_missing_data]
-
-    # Prepare the data to compute either the covariance or the quadratic distance.
-    if str_cost_function == "covariance":
-        data_points = 100 * assets_index_prices.pct_change(fill_method=None)
-        data_points.dropna(axis="index", how="all", inplace=True)
-    elif str_cost_function == "quadratic_distance":
-        np_latest_prices = assets_index_prices.iloc[-1].to_numpy()
-        b_any_price_in_lowest_row_is_nan = np.any(np.isnan(np_latest_prices))
-        if b_any_price_in_lowest_row_is_nan:
-            ix_tickers_with_nan = np.where(np.isnan(np_latest_prices))[0]
-            tickers_with_nan = tickers[ix_tickers_without_missing_data[ix_tickers_with_nan]].tolist()
-            for ticker in tickers_with_nan:
-                print(assets_index_prices[ticker])
-            raise Exception(
-                f"At {assets_index_prices.index[-1]}, the tickers: {tickers_with_nan} have a missing value in the price.\nTherefore, the quadratic distance cannot be computed."
-            )
-        data_points = assets_index_prices / assets_index_prices.iloc[-1]
+    num_assets = len(tickers) - 1
 
     # Compute cost function of the data.
-    np_data = data_points.to_numpy()
     b_remove_mean = str_cost_function == "covariance"
     np_cost_function_without_nan = compute_EWMA_cost_function(
-        np_data, EMWA_halflife, b_remove_mean=b_remove_mean
+        np_data, EMWA_halflife, b_remove_mean=b_remove_mean,
+        engine=engine, dtype=dtype, executor=executor
     )
-    # Add L2 regularization to the cost function.
-    np_cost_function_without_nan += l2_regularization * np.eye(np_cost_function_without_nan.shape[0])
-    # Fill only the cost function entries that correspond to assets 
-    # with sufficient values.
-    np_cost_function = np.zeros((num_assets + 1, num_assets + 1))
-    # Create two lists of indices, one for the rows and one for the columns, of
-    # all matrix elements without missing data.
-    I, J = np.meshgrid(ix_tickers_without_missing_data, ix_tickers_without_missing_data)
-    np_cost_function[I, J] = np_cost_function_without_nan
-
-    # Fill with 0 the rows and columns of the cost function matrix
-    # that correspond to assets with missing data and -1 in their
-    # diagonal entries.
-    for ix in ix_tickers_with_missing_data:
-        np_cost_function[ix, :] = 0
-        np_cost_function[:, ix] = 0
-        np_cost_function[ix, ix] = -1
-
-    cost_function_matrix = pd.DataFrame(
-        np_cost_function,
-        index=tickers,
-        columns=tickers
+    if b_return_compact:
+        return _compact_cost_function(
+            np_cost_function_without_nan, ix_tickers_without_missing_data,
+            num_assets, l2_regularization, tickers[:-1]
+        )
+    cost_matrix, benchmark_cost_vector = _assemble_cost_function(
+        np_cost_function_without_nan, ix_tickers_without_missing_data,
+        num_assets, l2_regularization
     )
-    cost_matrix = cost_function_matrix.iloc[:-1, :-1].to_numpy()
-    benchmark_cost_vector = cost_function_matrix.iloc[:-1, -1].to_numpy()
 
     # We do not include the benchmark_column, the last one after the reordering, in the tickers list that we return
-    return cost_matrix, benchmark_cost_vector, tickers[:-1].to_list()
+    return cost_matrix, benchmark_cost_vector, tickers[:-1]
 
 
 def compute_covariance_matrix(
@@ -119,16 +75,22 @@ def compute_covariance_matrix(
     date_to : str | pd.Timestamp,
     EMWA_halflife : int = 252,
     maximum_missing_data_ratio_allowed : float = 0.25,
-    l2_regularization : float = 0.0
+    l2_regularization : float = 0.0,
+    engine : str = "einsum",
+    dtype : np.dtype = np.double,
+    executor = None,
+    b_return_compact : bool = False
 ):
     """
     Compute the covariance matrix for asset returns using exponentially weighted moving average (EWMA).
 
     Parameters
     ----------
-    assets_index_prices : pandas.DataFrame
+    assets_index_prices : pandas.DataFrame, pyarrow.Table or tuple
         DataFrame containing asset price time series data. Each column should represent
-        an asset's prices indexed by dates.
+        an asset's prices indexed by dates. The prices can also be given without
+        pandas as a (dates, prices, tickers) triple of arrays, with one row of
+        prices per date, or as an Arrow table with the dates in the first column.
     benchmark_column : str
         The name of the column in the assets_index_prices that corresponds to the benchmark to follow.
     date_from : str or pandas.Timestamp
@@ -144,6 +106,17 @@ def compute_covariance_matrix(
     l2_regularization : float, default=0.0
         Norm-2 regularization strength to add to the diagonal elements of the 
         covariance matrix.
+    engine : str, {"einsum", "blas", "tiled"}, default="einsum"
+        Kernel of the EWMA products. See `compute_EWMA_cost_function`.
+    dtype : np.dtype, {np.double, np.single}, default=np.double
+        Floating point type of the products with the "blas" and "tiled"
+        engines. See `compute_EWMA_cost_function` for the expected accuracy.
+    executor : concurrent.futures.Executor, optional, default=None
+        Pool of threads of the "tiled" engine. If None, a shared pool is used.
+    b_return_compact : bool, default=False
+        If True, return a `CompactQuadraticUtility` with only the assets
+        without missing data instead of the triple below. Its `padded()`
+        method returns the triple.
 
     Returns
     -------
@@ -154,7 +127,7 @@ def compute_covariance_matrix(
     tickers (list[str]): A list of asset tickers excluding the benchmark asset.
 
     """
-    covariance_matrix, covariance_vector, tickers = compute_quadratic_utility(
+    quadratic_utility = compute_quadratic_utility(
         assets_index_prices=assets_index_prices,
         benchmark_column=benchmark_column,
         str_cost_function="covariance",
@@ -162,8 +135,15 @@ def compute_covariance_matrix(
         date_to=date_to,
         EMWA_halflife=EMWA_halflife,
         maximum_missing_data_ratio_allowed=maximum_missing_data_ratio_allowed,
-        l2_regularization=l2_regularization
+        l2_regularization=l2_regularization,
+        engine=engine,
+        dtype=dtype,
+        executor=executor,
+        b_return_compact=b_return_compact
     )
+    if b_return_compact:
+        return quadratic_utility
+    covariance_matrix, covariance_vector, tickers = quadratic_utility
     return covariance_matrix, covariance_vector, tickers
 
 
@@ -174,16 +154,22 @@ def compute_cumulative_returns_distance_matrix(
     date_to : str | pd.Timestamp,
     EMWA_halflife : int = 252,
     maximum_missing_data_ratio_allowed : float = 0.25,
-    l2_regularization : float = 0.0
+    l2_regularization : float = 0.0,
+    engine : str = "einsum",
+    dtype : np.dtype = np.double,
+    executor = None,
+    b_return_compact : bool = False
 ):
     """
     Compute the quadratic distance matrix for asset returns using exponentially weighted moving average (EWMA).
 
     Parameters
     ----------
-    assets_index_prices : pandas.DataFrame
+    assets_index_prices : pandas.DataFrame, pyarrow.Table or tuple
         DataFrame containing asset price time series data. Each column should represent
-        an asset's prices indexed by dates.
+        an asset's prices indexed by dates. The prices can also be given without
+        pandas as a (dates, prices, tickers) triple of arrays, with one row of
+        prices per date, or as an Arrow table with the dates in the first column.
     benchmark_column : str
         The name of the column in the assets_index_prices that corresponds to the benchmark to follow.
     date_from : str or pandas.Timestamp
@@ -199,6 +185,17 @@ def compute_cumulative_returns_distance_matrix(
     l2_regularization : float, default=0.0
         Norm-2 regularization strength to add to the diagonal elements of the 
         cumulative returns distance matrix.
+    engine : str, {"einsum", "blas", "tiled"}, default="einsum"
+        Kernel of the EWMA products. See `compute_EWMA_cost_function`.
+    dtype : np.dtype, {np.double, np.single}, default=np.double
+        Floating point type of the products with the "blas" and "tiled"
+        engines. See `compute_EWMA_cost_function` for the expected accuracy.
+    executor : concurrent.futures.Executor, optional, default=None
+        Pool of threads of the "tiled" engine. If None, a shared pool is used.
+    b_return_compact : bool, default=False
+        If True, return a `CompactQuadraticUtility` with only the assets
+        without missing data instead of the triple below. Its `padded()`
+        method returns the triple.
 
     Returns
     -------
@@ -209,7 +206,7 @@ def compute_cumulative_returns_distance_matrix(
     tickers (list[str]): A list of asset tickers excluding the benchmark asset.
 
     """
-    distance_matrix, distance_vector, tickers = compute_quadratic_utility(
+    quadratic_utility = compute_quadratic_utility(
         assets_index_prices=assets_index_prices,
         benchmark_column=benchmark_column,
         str_cost_function="quadratic_distance",
@@ -217,12 +214,403 @@ def compute_cumulative_returns_distance_matrix(
         date_to=date_to,
         EMWA_halflife=EMWA_halflife,
         maximum_missing_data_ratio_allowed=maximum_missing_data_ratio_allowed,
-        l2_regularization=l2_regularization
+        l2_regularization=l2_regularization,
+        engine=engine,
+        dtype=dtype,
+        executor=executor,
+        b_return_compact=b_return_compact
     )
+    if b_return_compact:
+        return quadratic_utility
+    distance_matrix, distance_vector, tickers = quadratic_utility
     return distance_matrix, distance_vector, tickers
 
 
-def compute_EWMA_cost_function(data, halflife, b_remove_mean):
+def compute_covariance_factor_model(
+    assets_index_prices : pd.DataFrame,
+    benchmark_column: str,
+    date_from : str | pd.Timestamp,
+    date_to : str | pd.Timestamp,
+    num_factors : int,
+    EMWA_halflife : int = 252,
+    maximum_missing_data_ratio_allowed : float = 0.25,
+    l2_regularization : float = 0.0,
+    method : str = "randomized"
+):
+    """
+    Compute the covariance matrix for asset returns as a low-rank plus diagonal `FactorModel`.
+
+    The covariance of the assets without missing data is computed as in
+    `compute_covariance_matrix` and approximated by its `num_factors` main
+    components plus a diagonal that keeps the variances of the assets. As in
+    the dense matrix, the assets with missing data have no factor loadings
+    and -1 as their variance.
+
+    Parameters
+    ----------
+    assets_index_prices : pandas.DataFrame, pyarrow.Table or tuple
+        DataFrame containing asset price time series data indexed by dates, an
+        Arrow table with the dates in the first column, or a (dates, prices,
+        tickers) triple of arrays.
+    benchmark_column : str
+        The name of the column in the assets_index_prices that corresponds to the benchmark to follow.
+    date_from : str or pandas.Timestamp
+        Start date for the covariance calculation period.
+    date_to : str or pandas.Timestamp
+        End date for the covariance calculation period.
+    num_factors : int
+        Number of factors of the model.
+    EMWA_halflife : int, default=252
+        Half-life parameter for the exponential weighting, specified in trading days.
+    maximum_missing_data_ratio_allowed : float, default=0.25
+        Maximum allowed ratio of missing data points to total observations.
+    l2_regularization : float, default=0.0
+        Norm-2 regularization strength to add to the diagonal elements of the
+        covariance matrix.
+    method : str, {"eigh", "randomized"}, default="randomized"
+        Method to find the main components. See `FactorModel.from_matrix`.
+
+    Returns
+    -------
+    factor_model (FactorModel): Factor model of the covariance between assets, excluding the benchmark asset.
+
+    benchmark_cost_vector (numpy.ndarray): A vector containing the covariance values of each asset with the benchmark asset.
+
+    tickers (list[str]): A list of asset tickers excluding the benchmark asset.
+
+    """
+    compact_covariance = compute_covariance_matrix(
+        assets_index_prices, benchmark_column, date_from, date_to,
+        EMWA_halflife=EMWA_halflife,
+        maximum_missing_data_ratio_allowed=maximum_missing_data_ratio_allowed,
+        l2_regularization=l2_regularization,
+        engine="blas",
+        b_return_compact=True
+    )
+    ix = compact_covariance.ix_assets_without_missing_data
+    num_factors = min(num_factors, ix.size)
+    compact_factor_model = FactorModel.from_matrix(
+        compact_covariance.cost_matrix, num_factors, method=method
+    )
+
+    num_assets = compact_covariance.num_assets
+    factor_loadings = np.zeros((num_assets, num_factors))
+    factor_loadings[ix] = compact_factor_model.factor_loadings
+    idiosyncratic_variances = np.full(num_assets, -1.0)
+    idiosyncratic_variances[ix] = compact_factor_model.idiosyncratic_variances
+    benchmark_cost_vector = np.zeros(num_assets)
+    benchmark_cost_vector[ix] = compact_covariance.benchmark_cost_vector
+
+    factor_model = FactorModel(factor_loadings, idiosyncratic_variances)
+    return factor_model, benchmark_cost_vector, compact_covariance.tickers
+
+def compute_quadratic_utility_rolling(
+    assets_index_prices : pd.DataFrame,
+    benchmark_column: str,
+    str_cost_function : str,
+    rebalance_dates,
+    date_from : str | pd.Timestamp | None = None,
+    lookback : str | pd.Timedelta | pd.DateOffset | None = None,
+    EMWA_halflife : int = 252,
+    maximum_missing_data_ratio_allowed : float = 0.0,
+    l2_regularization : float = 0.0
+):
+    """
+    Compute the quadratic utility at many rebalance dates, e.g. for a backtest.
+
+    The prices are reordered and sorted once, and the EWMA sums of the cost
+    function are rolled forward from one rebalance date to the next with a
+    `QuadraticUtilityUpdater`, adding the new dates and removing the ones that
+    leave the window instead of recomputing the whole window. The results are
+    yielded one date at a time, so only one cost matrix is held in memory.
+
+    For every rebalance date `date_to`, the result is the same as
+    `compute_quadratic_utility` with the window `date_from:date_to`, or
+    `date_to - lookback:date_to` if `lookback` is given.
+
+    Parameters
+    ----------
+    assets_index_prices : pandas.DataFrame, pyarrow.Table or tuple
+        DataFrame containing asset price time series data indexed by dates, an
+        Arrow table with the dates in the first column, or a (dates, prices,
+        tickers) triple of arrays.
+    benchmark_column : str
+        The name of the column in the assets_index_prices that corresponds to the benchmark to follow.
+    str_cost_function : str, {"covariance", "quadratic_distance"}
+        Cost function to compute.
+    rebalance_dates : sequence of str or pandas.Timestamp
+        End dates of the windows, in increasing order.
+    date_from : str or pandas.Timestamp, optional, default=None
+        Start date of an expanding window. Either `date_from` or `lookback`
+        must be given.
+    lookback : str, pandas.Timedelta or pandas.DateOffset, optional, default=None
+        Length of a rolling window ending at each rebalance date, e.g. "730D".
+    EMWA_halflife : int, default=252
+        Half-life parameter for the exponential weighting, specified in trading days.
+    maximum_missing_data_ratio_allowed : float, default=0.0
+        Maximum allowed ratio of missing data points to total observations.
+    l2_regularization : float, default=0.0
+        Norm-2 regularization strength to add to the diagonal elements of the
+        cost function matrix.
+
+    Yields
+    ------
+    cost_matrix (numpy.ndarray): A square matrix with the cost function between assets, excluding the benchmark asset.
+
+    benchmark_cost_vector (numpy.ndarray): A vector containing the cost function of each asset with the benchmark asset.
+
+    tickers (list[str]): A list of asset tickers excluding the benchmark asset.
+
+    """
+    if (date_from is None) == (lookback is None):
+        raise ValueError("Exactly one of 'date_from' or 'lookback' must be given.")
+    if lookback is not None and not isinstance(lookback, np.timedelta64):
+        import pandas as pd
+        if isinstance(lookback, str):
+            lookback = pd.Timedelta(lookback)
+
+    dates, read_prices, tickers = _as_price_arrays(assets_index_prices)
+    if benchmark_column not in tickers:
+        raise ValueError(f"Benchmark column '{benchmark_column}' is not in the provided DataFrame.")
+    updater = QuadraticUtilityUpdater(
+        tickers, benchmark_column, str_cost_function,
+        EMWA_halflife=EMWA_halflife,
+        maximum_missing_data_ratio_allowed=maximum_missing_data_ratio_allowed,
+        l2_regularization=l2_regularization
+    )
+    # Make sure that the prices dataset is ordered from earliest (top row)
+    # to latest date (bottom row).
+    ix_sorted_rows = np.argsort(dates, kind="stable")
+    dates = dates[ix_sorted_rows]
+    np_prices = read_prices(ix_sorted_rows, np.arange(len(tickers)))
+
+    # Rows of np_prices that are in the window of the updater.
+    ix_start = 0
+    ix_stop = 0
+    for date_to in rebalance_dates:
+        if lookback is None:
+            window_start = date_from
+        elif isinstance(lookback, np.timedelta64):
+            window_start = np.datetime64(date_to) - lookback
+        else:
+            window_start = pd.Timestamp(date_to) - lookback
+        ix_new_start = _first_row_from(dates, window_start)
+        ix_new_stop = _first_row_after(dates, date_to)
+        if ix_new_stop < ix_stop or ix_new_start < ix_start:
+            raise ValueError(f"The rebalance dates must be in increasing order. Got {date_to} after a later date.")
+
+        if ix_new_start >= ix_stop:
+            # The windows do not overlap.
+            updater.remove_oldest(updater.num_samples)
+            updater.update(np_prices[ix_new_start:ix_new_stop])
+        else:
+            updater.remove_oldest(ix_new_start - ix_start)
+            updater.update(np_prices[ix_stop:ix_new_stop])
+        ix_start = ix_new_start
+        ix_stop = max(ix_new_stop, ix_new_start)
+
+        yield updater.compute()
+
+
+def compute_quadratic_utility_multiple_halflives(
+    assets_index_prices : pd.DataFrame,
+    benchmark_column: str,
+    str_cost_function : str,
+    date_from : str | pd.Timestamp,
+    date_to : str | pd.Timestamp,
+    EMWA_halflives = (63, 126, 252, 504),
+    maximum_missing_data_ratio_allowed : float = 0.0,
+    l2_regularization : float = 0.0,
+    dtype : np.dtype = np.double
+):
+    """
+    Compute the quadratic utility for several EWMA half-lives, e.g. to tune it.
+
+    The window selection, the missing data filter and the transformation of
+    the prices into returns or distances are done once, and the cost functions
+    of all the half-lives are computed with `compute_EWMA_cost_functions`.
+    The result for each half-life is the same as `compute_quadratic_utility`.
+
+    Parameters
+    ----------
+    assets_index_prices : pandas.DataFrame, pyarrow.Table or tuple
+        DataFrame containing asset price time series data indexed by dates, an
+        Arrow table with the dates in the first column, or a (dates, prices,
+        tickers) triple of arrays.
+    benchmark_column : str
+        The name of the column in the assets_index_prices that corresponds to the benchmark to follow.
+    str_cost_function : str, {"covariance", "quadratic_distance"}
+        Cost function to compute.
+    date_from : str or pandas.Timestamp
+        Start date for the calculation period.
+    date_to : str or pandas.Timestamp
+        End date for the calculation period.
+    EMWA_halflives : sequence of int, default=(63, 126, 252, 504)
+        Half-life parameters for the exponential weighting, specified in trading days.
+    maximum_missing_data_ratio_allowed : float, default=0.0
+        Maximum allowed ratio of missing data points to total observations.
+    l2_regularization : float, default=0.0
+        Norm-2 regularization strength to add to the diagonal elements of the
+        cost function matrices.
+    dtype : np.dtype, {np.double, np.single}, default=np.double
+        Floating point type of the products. See `compute_EWMA_cost_function`.
+
+    Returns
+    -------
+    cost_matrices (numpy.ndarray): Array of shape (n_halflives, n_assets, n_assets) with the cost matrix of each half-life, excluding the benchmark asset.
+
+    benchmark_cost_vectors (numpy.ndarray): Array of shape (n_halflives, n_assets) with the cost function of each asset with the benchmark asset for each half-life.
+
+    tickers (list[str]): A list of asset tickers excluding the benchmark asset.
+
+    """
+    np_data, ix_tickers_without_missing_data, tickers = _prepare_data_points(
+        assets_index_prices, benchmark_column, str_cost_function,
+        date_from, date_to, maximum_missing_data_ratio_allowed
+    )
+    num_assets = len(tickers) - 1
+
+    b_remove_mean = str_cost_function == "covariance"
+    np_cost_functions_without_nan = compute_EWMA_cost_functions(
+        np_data, EMWA_halflives, b_remove_mean=b_remove_mean, dtype=dtype
+    )
+    num_halflives = np_cost_functions_without_nan.shape[0]
+    cost_matrices = np.empty((num_halflives, num_assets, num_assets))
+    benchmark_cost_vectors = np.empty((num_halflives, num_assets))
+    for i in range(num_halflives):
+        cost_matrices[i], benchmark_cost_vectors[i] = _assemble_cost_function(
+            np_cost_functions_without_nan[i], ix_tickers_without_missing_data,
+            num_assets, l2_regularization
+        )
+
+    # We do not include the benchmark_column, the last one after the reordering, in the tickers list that we return
+    return cost_matrices, benchmark_cost_vectors, tickers[:-1]
+
+
+def compute_quadratic_utility_out_of_core(
+    prices,
+    tickers,
+    benchmark_column: str,
+    str_cost_function : str,
+    EMWA_halflife : int = 252,
+    maximum_missing_data_ratio_allowed : float = 0.0,
+    l2_regularization : float = 0.0,
+    memory_budget : int = 256 * 2**20
+):
+    """
+    Compute the quadratic utility of a price panel that does not fit in memory.
+
+    The prices are read in blocks of consecutive dates and accumulated in the
+    decayed sums of an `EWMACostFunctionUpdater`, so the whole panel is never
+    loaded and no full-size copy of it is made. Besides the (n_assets, n_assets)
+    sums and the output, the peak memory is bounded by `memory_budget`.
+
+    The result is the same as `compute_quadratic_utility` with all the dates of
+    the panel, except in the unusual case of a date whose returns are missing
+    for all the assets that pass the missing data filter but not for all the
+    tickers.
+
+    Parameters
+    ----------
+    prices : np.ndarray[(n_dates, n_tickers), dtype=np.double] or iterable
+        Prices ordered from earliest (top row) to latest date (bottom row),
+        with one column per ticker. Any array that is only read by blocks of
+        rows can be given, e.g. a `np.memmap` or `np.load(file, mmap_mode="r")`.
+        It can also be an iterable of consecutive blocks of rows, e.g. read
+        from a chunked file, whose size is then chosen by the caller. Select
+        the window of dates by slicing the rows of the array.
+    tickers : list[str]
+        Names of the columns of the prices.
+    benchmark_column : str
+        The name of the column that corresponds to the benchmark to follow.
+    str_cost_function : str, {"covariance", "quadratic_distance"}
+        Cost function to compute.
+    EMWA_halflife : int, default=252
+        Half-life parameter for the exponential weighting, specified in trading days.
+    maximum_missing_data_ratio_allowed : float, default=0.0
+        Maximum allowed ratio of missing data points to total observations.
+    l2_regularization : float, default=0.0
+        Norm-2 regularization strength to add to the diagonal elements of the
+        cost function matrix.
+    memory_budget : int, default=256 MiB
+        Maximum number of bytes used by the blocks of prices and their
+        temporaries when the prices are an array.
+
+    Returns
+    -------
+    cost_matrix (numpy.ndarray): A square matrix with the cost function between assets, excluding the benchmark asset.
+
+    benchmark_cost_vector (numpy.ndarray): A vector containing the cost function of each asset with the benchmark asset.
+
+    tickers (list[str]): A list of asset tickers excluding the benchmark asset.
+
+    """
+    if str_cost_function not in ["covariance", "quadratic_distance"]:
+        raise ValueError(f"Cost function '{str_cost_function}' is not valid. Possible values are 'covariance' or 'quadratic_distance'.")
+    tickers = list(tickers)
+    if benchmark_column not in tickers:
+        raise ValueError(f"Benchmark column '{benchmark_column}' is not in the provided tickers.")
+
+    # Move benchmark column to the last position
+    ix_columns = np.array(
+        [i for i, ticker in enumerate(tickers) if ticker != benchmark_column]
+        + [tickers.index(benchmark_column)]
+    )
+    tickers = [tickers[i] for i in ix_columns]
+    num_assets = len(tickers) - 1
+
+    b_remove_mean = str_cost_function == "covariance"
+    cost_function_updater = EWMACostFunctionUpdater(num_assets + 1, EMWA_halflife, b_remove_mean)
+    num_prices_per_ticker = np.zeros(num_assets + 1, dtype=np.int64)
+    num_samples = 0
+    np_latest_prices = None
+
+    # The updater makes about six temporary copies of each block.
+    num_rows_per_block = max(1, int(memory_budget) // (8 * 8 * (num_assets + 1)))
+    for np_block in _iterate_blocks_of_rows(prices, num_rows_per_block):
+        np_block = np_block[:, ix_columns]
+        if str_cost_function == "covariance":
+            if np_latest_prices is None:
+                previous_prices = np_block[:-1]
+                data_points = 100 * (np_block[1:] / previous_prices - 1)
+            else:
+                previous_prices = np.concatenate((np_latest_prices[None, :], np_block[:-1]), axis=0)
+                data_points = 100 * (np_block / previous_prices - 1)
+            data_points = data_points[~np.all(np.isnan(data_points), axis=1)]
+        elif str_cost_function == "quadratic_distance":
+            # The prices are divided by the latest price at the end.
+            data_points = np_block
+        cost_function_updater.update(data_points)
+
+        num_prices_per_ticker += np.count_nonzero(~np.isnan(np_block), axis=0)
+        num_samples += np_block.shape[0]
+        np_latest_prices = np_block[-1].copy()
+
+    if num_samples == 0:
+        raise ValueError("There are no prices in the panel.")
+
+    ix_tickers_without_missing_data = _find_tickers_without_missing_data(
+        num_prices_per_ticker, num_samples, np_latest_prices,
+        str_cost_function, maximum_missing_data_ratio_allowed
+    )
+    np_cost_function = cost_function_updater.cost_function()
+    del cost_function_updater
+    np_cost_function_without_nan = np_cost_function[np.ix_(ix_tickers_without_missing_data, ix_tickers_without_missing_data)]
+    if str_cost_function == "quadratic_distance":
+        np_latest_prices = np_latest_prices[ix_tickers_without_missing_data]
+        np_cost_function_without_nan /= np.outer(np_latest_prices, np_latest_prices)
+
+    cost_matrix, benchmark_cost_vector = _assemble_cost_function(
+        np_cost_function_without_nan, ix_tickers_without_missing_data,
+        num_assets, l2_regularization
+    )
+    return cost_matrix, benchmark_cost_vector, tickers[:-1]
+
+
+def compute_EWMA_cost_function(
+    data, halflife, b_remove_mean,
+    engine="einsum", dtype=np.double, executor=None, tile_size=512
+):
     """Compute the Exponentially Weigthed Moving Average of a set of data samples.
 
     Parameters
@@ -234,6 +622,32 @@ def compute_EWMA_cost_function(data, halflife, b_remove_mean):
     b_remove_mean : bool
         If True, then remove the mean of all features before computing
         the EMWA.
+    engine : str, {"einsum", "blas"}, default="einsum"
+        Kernel used for the weighted products of the samples. "einsum" is the
+        reference implementation. "blas" scales every sample by the square
+        root of its weight and computes the products as X.T @ X, which numpy
+        dispatches to a symmetric rank-k update (syrk) that only computes one
+        triangle. The missing data mask is kept as a boolean matrix and only
+        converted to `dtype` when it is scaled. "tiled" is the "blas" engine
+        with the output split into square tiles of `tile_size` features. The
+        tiles of the upper triangle are computed in parallel by `executor`
+        and mirrored to the lower one. The tiles do not depend on the number
+        of workers, so the result is identical for any number of them.
+    dtype : np.dtype, {np.double, np.single}, default=np.double
+        Floating point type of the products with the "blas" and "tiled"
+        engines. With
+        np.double the result matches the "einsum" engine up to rounding
+        errors (relative differences around 1e-12). With np.single the
+        memory traffic is halved and the relative differences are around
+        1e-5. The mean is always removed in double precision and the
+        result is always returned in double precision.
+    executor : concurrent.futures.Executor, optional, default=None
+        Pool of threads that computes the tiles with the "tiled" engine. It can
+        be reused across calls. If None, a pool shared by all the calls with
+        one worker per CPU is used. The BLAS library may also use several
+        threads inside each tile, so it can be convenient to limit them.
+    tile_size : int, default=512
+        Number of features per side of the tiles of the "tiled" engine.
 
     Returns
     -------
@@ -241,6 +655,13 @@ def compute_EWMA_cost_function(data, halflife, b_remove_mean):
         EWMA of the matrix of samples.
 
     """
+    if engine not in ["einsum", "blas", "tiled"]:
+        raise ValueError(f"Engine '{engine}' is not valid. Possible values are 'einsum', 'blas' or 'tiled'.")
+    if np.dtype(dtype) not in [np.double, np.single]:
+        raise ValueError(f"The dtype '{dtype}' is not valid. Possible values are np.double or np.single.")
+    if engine == "einsum" and np.dtype(dtype) != np.double:
+        raise ValueError("The 'einsum' engine only supports dtype=np.double.")
+
     T = data.shape[0]  # Number of time periods.
 
     # Exponential weights.
@@ -250,15 +671,883 @@ def compute_EWMA_cost_function(data, halflife, b_remove_mean):
         means = np.nanmean(data, axis=0, keepdims=True)
         data = data - means
 
-    # Boolean matrix with missing data marked as 0 and non-missing as 1.
-    b_data = np.ones_like(data)
-    b_data[np.isnan(data)] = 0
-    # Fill missing data values in the sample matrix to 0.
-    data = np.nan_to_num(data, nan=0)
+    if engine == "tiled":
+        if executor is None:
+            executor = _get_default_executor()
+        tiles = (executor, int(tile_size))
+    else:
+        tiles = None
+
+    if engine in ["blas", "tiled"]:
+        b_missing_data = np.isnan(data)
+        sqrt_exp_weights = np.sqrt(exp_weights)[:, None].astype(dtype)
+        # Scaled samples with the missing values filled with 0. The entries that
+        # had a missing value will not modify the cost function.
+        scaled_data = np.nan_to_num(data.astype(dtype), nan=0)
+        scaled_data *= sqrt_exp_weights
+        cost = _symmetric_product(scaled_data, tiles)
+        del scaled_data
+    else:
+        b_missing_data = np.isnan(data)
+        # Fill missing data values in the sample matrix to 0.
+        data = np.nan_to_num(data, nan=0)
+
+        # Estimate the cost function matrix. The entries that had a missing value
+        # have been replaced with 0, so they will modify the cost function.
+        cost = np.einsum('ti,t,tj->ij', data, exp_weights, data)
 
-    # Estimate the cost function matrix. The entries that had a missing value
-    # have been replaced with 0, so they will modify the cost function.
-    cost = np.einsum('ti,t,tj->ij', data, exp_weights, data)
-    normalization = np.einsum('ti,t,tj->ij', b_data, exp_weights, b_data)
+    normalization = _compute_EWMA_normalization(b_missing_data, exp_weights, engine, dtype, tiles)
     cost = cost / normalization
     return cost
+
+
+def compute_EWMA_cost_functions(data, halflives, b_remove_mean, dtype=np.double):
+    """Compute the Exponentially Weigthed Moving Average of a set of data samples
+    for several half-lives at once.
+
+    The mean removal, the missing data mask and the filled samples are shared
+    by all the half-lives, and the weighted products of all of them are
+    computed with one batched matrix product.
+
+    Parameters
+    ----------
+    data : np.ndarray[(n_samples, n_assets), dtype=np.double]
+        Matrix of data samples. Each row contains one sample.
+    halflives : sequence of float
+        Half-lives of the exponential weights.
+    b_remove_mean : bool
+        If True, then remove the mean of all features before computing
+        the EMWA.
+    dtype : np.dtype, {np.double, np.single}, default=np.double
+        Floating point type of the products. See `compute_EWMA_cost_function`.
+
+    Returns
+    -------
+    cost : np.ndarray[(n_halflives, n_assets, n_assets), dtype=np.double]
+        EWMA of the matrix of samples for each half-life.
+
+    """
+    if np.dtype(dtype) not in [np.double, np.single]:
+        raise ValueError(f"The dtype '{dtype}' is not valid. Possible values are np.double or np.single.")
+    halflives = np.asarray(halflives, dtype=np.double)
+    if halflives.ndim != 1:
+        raise ValueError(f"The half-lives must be a sequence of numbers. Got:\n{halflives}")
+
+    T = data.shape[0]  # Number of time periods.
+
+    # Exponential weights, one row per half-life.
+    exp_weights = 2.0 ** ( - np.flipud(np.arange(T))[None, :] / halflives[:, None] )
+
+    if b_remove_mean:
+        means = np.nanmean(data, axis=0, keepdims=True)
+        data = data - means
+
+    b_missing_data = np.isnan(data)
+    data = np.nan_to_num(data.astype(dtype), nan=0)
+    sqrt_exp_weights = np.sqrt(exp_weights)[:, :, None].astype(dtype)
+    cost = _symmetric_product(data[None, :, :] * sqrt_exp_weights)
+    normalization = _compute_EWMA_normalization(b_missing_data, exp_weights, "blas", dtype)
+    cost = cost / normalization
+    return cost
+
+
+def _compute_EWMA_normalization(b_missing_data, exp_weights, engine, dtype, tiles=None):
+    """Sum of the weights of the samples where both features are available,
+    sum_t w_t b_ti b_tj with b_ti = 0 if the sample is missing and 1 otherwise.
+
+    Without missing data every entry is the sum of the weights, which is
+    returned as a scalar. Otherwise, the features with the same pattern of
+    missing data, e.g. stocks listed on the same date, have the same rows and
+    columns in the normalization, so it is only computed once per pattern.
+
+    The weights can also be a matrix with one row of weights per half-life,
+    in which case the normalizations are stacked along the first axis. This
+    is only supported by the "blas" engine, and `tiles` by the "tiled" one.
+
+    """
+    if not b_missing_data.any():
+        return exp_weights.sum(axis=-1)[..., None, None]
+
+    num_features = b_missing_data.shape[1]
+    # Group the columns by their pattern of missing data, packed in bits.
+    np_patterns = np.packbits(b_missing_data, axis=0).T
+    _, ix_of_first_feature_with_pattern, ix_pattern_of_feature = np.unique(
+        np_patterns, axis=0, return_index=True, return_inverse=True
+    )
+    b_all_patterns_are_different = ix_of_first_feature_with_pattern.size == num_features
+    if b_all_patterns_are_different:
+        b_data = ~b_missing_data
+    else:
+        b_data = ~b_missing_data[:, ix_of_first_feature_with_pattern]
+
+    if engine in ["blas", "tiled"]:
+        sqrt_exp_weights = np.sqrt(exp_weights)[..., None].astype(dtype)
+        normalization = _symmetric_product(np.multiply(b_data, sqrt_exp_weights, dtype=dtype), tiles)
+    else:
+        b_data = b_data.astype(np.double)
+        normalization = np.einsum('ti,t,tj->ij', b_data, exp_weights, b_data)
+
+    if b_all_patterns_are_different:
+        return normalization
+    ix_pattern_of_feature = ix_pattern_of_feature.ravel()
+    return normalization.take(ix_pattern_of_feature, axis=-1).take(ix_pattern_of_feature, axis=-2)
+
+
+def _symmetric_product(scaled_data, tiles=None):
+    """X.T @ X in double precision. Numpy uses syrk for the product of a
+    contiguous matrix with its own transpose. A stack of matrices is
+    multiplied with a single batched matmul.
+
+    If `tiles` is an (executor, tile_size) pair, the output of a single matrix
+    is split into tiles and the tiles of the upper triangle are computed in
+    the executor."""
+    scaled_data = np.ascontiguousarray(scaled_data)
+    if tiles is None or scaled_data.ndim != 2:
+        return (np.swapaxes(scaled_data, -1, -2) @ scaled_data).astype(np.double, copy=False)
+
+    executor, tile_size = tiles
+    if tile_size < 1:
+        raise ValueError(f"The tile size must be a positive number of features. Got: {tile_size}")
+    num_features = scaled_data.shape[1]
+    # Contiguous blocks of columns, so that every tile is a plain BLAS call.
+    blocks = [
+        np.ascontiguousarray(scaled_data[:, ix:ix + tile_size])
+        for ix in range(0, num_features, tile_size)
+    ]
+    product = np.empty((num_features, num_features))
+
+    def compute_tile(i, j):
+        # Tiles are written in disjoint parts of the output, so no lock is needed.
+        if i == j:
+            tile = blocks[i].T @ blocks[i]
+        else:
+            tile = blocks[i].T @ blocks[j]
+        rows = slice(i * tile_size, i * tile_size + blocks[i].shape[1])
+        columns = slice(j * tile_size, j * tile_size + blocks[j].shape[1])
+        product[rows, columns] = tile
+        if i != j:
+            product[columns, rows] = tile.T
+
+    futures = [
+        executor.submit(compute_tile, i, j)
+        for i in range(len(blocks))
+        for j in range(i, len(blocks))
+    ]
+    for future in futures:
+        future.result()
+    return product
+
+
+_default_executor = None
+_default_executor_lock = threading.Lock()
+
+
+def _get_default_executor():
+    """Pool of threads shared by all the calls with the "tiled" engine."""
+    global _default_executor
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+    return _default_executor
+
+
+class CompactQuadraticUtility:
+    """Quadratic utility restricted to the assets without missing data.
+
+    The cost functions returned by `compute_quadratic_utility` have one row and
+    column per asset, with 0's in the rows and columns of the assets with
+    missing data and -1 in their diagonal elements. This class only keeps the
+    dense matrix of the assets without missing data and their indices, and
+    builds the padded form on request with `padded()`.
+
+    Attributes
+    ----------
+    cost_matrix : np.ndarray[(n_assets_without_missing_data, n_assets_without_missing_data), dtype=np.double]
+        Cost function between the assets without missing data.
+    benchmark_cost_vector : np.ndarray[(n_assets_without_missing_data,), dtype=np.double]
+        Cost function of each asset without missing data with the benchmark.
+        It is 0 if the benchmark has missing data.
+    ix_assets_without_missing_data : np.ndarray[(n_assets_without_missing_data,), dtype=int]
+        Indices of the assets without missing data in `tickers`.
+    num_assets : int
+        Number of assets, excluding the benchmark.
+    tickers : list[str] or None
+        List of all asset tickers excluding the benchmark asset.
+
+    """
+
+    def __init__(
+        self,
+        cost_matrix,
+        benchmark_cost_vector,
+        ix_assets_without_missing_data,
+        num_assets,
+        tickers=None
+    ):
+        self.cost_matrix = cost_matrix
+        self.benchmark_cost_vector = benchmark_cost_vector
+        self.ix_assets_without_missing_data = np.asarray(ix_assets_without_missing_data)
+        self.num_assets = int(num_assets)
+        self.tickers = tickers
+
+    @property
+    def tickers_without_missing_data(self):
+        """Tickers of the rows and columns of `cost_matrix`."""
+        if self.tickers is None:
+            return None
+        return [self.tickers[ix] for ix in self.ix_assets_without_missing_data]
+
+    def padded(self):
+        """Cost function of all the assets, as returned by `compute_quadratic_utility`.
+
+        Returns
+        -------
+        cost_matrix (numpy.ndarray): A square matrix with the cost function between assets, excluding the benchmark asset.
+
+        benchmark_cost_vector (numpy.ndarray): A vector containing the cost function of each asset with the benchmark asset.
+
+        tickers (list[str]): A list of asset tickers excluding the benchmark asset.
+
+        """
+        ix = self.ix_assets_without_missing_data
+        cost_matrix = np.zeros((self.num_assets, self.num_assets))
+        cost_matrix[np.ix_(ix, ix)] = self.cost_matrix
+        # Assets with missing data have -1 in their diagonal entries.
+        b_asset_with_missing_data = np.ones(self.num_assets, dtype=bool)
+        b_asset_with_missing_data[ix] = False
+        ix_assets_with_missing_data = np.flatnonzero(b_asset_with_missing_data)
+        cost_matrix[ix_assets_with_missing_data, ix_assets_with_missing_data] = -1
+
+        benchmark_cost_vector = np.zeros(self.num_assets)
+        benchmark_cost_vector[ix] = self.benchmark_cost_vector
+        return cost_matrix, benchmark_cost_vector, self.tickers
+
+
+class EWMACostFunctionUpdater:
+    """Incremental version of `compute_EWMA_cost_function`.
+
+    Keeps the exponentially decayed sums from which the EWMA cost function
+    is obtained, so that adding new samples only decays the sums and adds
+    one rank-1 update per sample. Adding (or removing) one sample costs
+    O(n_assets**2) instead of the O(n_samples * n_assets**2) of recomputing
+    the whole window.
+
+    After feeding it with a matrix of samples `data`, row by row or in
+    blocks, `cost_function()` returns the same matrix as
+    `compute_EWMA_cost_function(data, halflife, b_remove_mean)`.
+
+    Parameters
+    ----------
+    num_features : int
+        Number of columns of the data samples.
+    halflife : float
+        Half-life of the exponential weights.
+    b_remove_mean : bool
+        If True, then remove the mean of all features before computing
+        the EMWA.
+
+    """
+
+    def __init__(self, num_features, halflife, b_remove_mean):
+        self.num_features = int(num_features)
+        self.halflife = float(halflife)
+        self.b_remove_mean = bool(b_remove_mean)
+        self.num_samples = 0
+        # Sum of w_t x_ti x_tj, with missing values set to 0.
+        self.weighted_products = np.zeros((self.num_features, self.num_features))
+        # Sum of w_t b_ti b_tj, with b_t = 0 for missing values and 1 otherwise.
+        self.normalization = np.zeros((self.num_features, self.num_features))
+        if self.b_remove_mean:
+            # Sum of w_t b_ti x_tj, needed to remove the mean afterwards, and the
+            # unweighted sums and counts of each feature to compute the mean.
+            self.weighted_cross_products = np.zeros((self.num_features, self.num_features))
+            self.sum_of_samples = np.zeros(self.num_features)
+            self.num_samples_per_feature = np.zeros(self.num_features, dtype=np.int64)
+
+    @property
+    def decay(self):
+        """Factor that multiplies the weight of every sample when a newer
+        sample is added."""
+        return 2.0 ** (-1.0 / self.halflife)
+
+    def update(self, data):
+        """Add new samples, ordered from earliest to latest, as the newest ones.
+
+        Parameters
+        ----------
+        data : np.ndarray[(n_new_samples, n_assets), dtype=np.double]
+            New samples. A single sample can be given as a vector.
+
+        """
+        data = self._validate_samples(data)
+        num_new_samples = data.shape[0]
+        if num_new_samples == 0:
+            return self
+        decay_of_old_samples = self.decay ** num_new_samples
+        exp_weights = self.decay ** np.flipud(np.arange(num_new_samples))
+        self._accumulate(data, exp_weights, decay_of_old_samples, sign=1)
+        self.num_samples += num_new_samples
+        return self
+
+    def remove_oldest(self, data):
+        """Remove the oldest samples, e.g. to keep a rolling window.
+
+        Parameters
+        ----------
+        data : np.ndarray[(n_old_samples, n_assets), dtype=np.double]
+            Oldest samples that are still in the sums, ordered from earliest
+            to latest. They must be exactly the ones that were added, since
+            their contribution is subtracted from the decayed sums.
+
+        """
+        data = self._validate_samples(data)
+        num_old_samples = data.shape[0]
+        if num_old_samples > self.num_samples:
+            raise ValueError(f"Cannot remove {num_old_samples} samples, there are only {self.num_samples}.")
+        if num_old_samples == 0:
+            return self
+        exp_weights = self.decay ** (self.num_samples - 1 - np.arange(num_old_samples))
+        self._accumulate(data, exp_weights, 1.0, sign=-1)
+        self.num_samples -= num_old_samples
+        return self
+
+    def cost_function(self):
+        """EWMA cost function of all the samples in the sums.
+
+        Returns
+        -------
+        cost : np.ndarray[(n_assets, n_assets), dtype=np.double]
+            EWMA of the matrix of samples.
+
+        """
+        cost = self.weighted_products
+        if self.b_remove_mean:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                means = self.sum_of_samples / self.num_samples_per_feature
+            # Expansion of sum_t w_t b_ti b_tj (x_ti - m_i) (x_tj - m_j).
+            cost = (
+                cost
+                - means[:, None] * self.weighted_cross_products
+                - self.weighted_cross_products.T * means[None, :]
+                + np.outer(means, means) * self.normalization
+            )
+        # Features without any sample have a null normalization and a NaN cost.
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return cost / self.normalization
+
+    def get_state(self):
+        """Dictionary with the whole state of the updater. It only contains
+        numpy arrays, so it can be stored with `np.savez`."""
+        state = {
+            "num_features": np.array(self.num_features),
+            "halflife": np.array(self.halflife),
+            "b_remove_mean": np.array(self.b_remove_mean),
+            "num_samples": np.array(self.num_samples),
+            "weighted_products": self.weighted_products,
+            "normalization": self.normalization,
+        }
+        if self.b_remove_mean:
+            state |= {
+                "weighted_cross_products": self.weighted_cross_products,
+                "sum_of_samples": self.sum_of_samples,
+                "num_samples_per_feature": self.num_samples_per_feature,
+            }
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        """Build an updater from the dictionary returned by `get_state`."""
+        updater = cls(
+            int(state["num_features"]), float(state["halflife"]), bool(state["b_remove_mean"])
+        )
+        updater.num_samples = int(state["num_samples"])
+        updater.weighted_products = np.array(state["weighted_products"], dtype=np.double)
+        updater.normalization = np.array(state["normalization"], dtype=np.double)
+        if updater.b_remove_mean:
+            updater.weighted_cross_products = np.array(state["weighted_cross_products"], dtype=np.double)
+            updater.sum_of_samples = np.array(state["sum_of_samples"], dtype=np.double)
+            updater.num_samples_per_feature = np.array(state["num_samples_per_feature"], dtype=np.int64)
+        return updater
+
+    def save(self, file):
+        """Store the state of the updater in a `.npz` file."""
+        np.savez(file, **self.get_state())
+
+    @classmethod
+    def load(cls, file):
+        """Load an updater stored with `save`."""
+        with np.load(file) as state:
+            return cls.from_state(state)
+
+    def _validate_samples(self, data):
+        data = np.asarray(data, dtype=np.double)
+        if data.ndim == 1:
+            data = data[None, :]
+        if data.ndim != 2 or data.shape[1] != self.num_features:
+            raise ValueError(f"The samples must have {self.num_features} features. Got an array with shape {data.shape}.")
+        return data
+
+    def _accumulate(self, data, exp_weights, decay_of_old_samples, sign):
+        # Boolean matrix with missing data marked as 0 and non-missing as 1.
+        b_data = np.ones_like(data)
+        b_data[np.isnan(data)] = 0
+        # Fill missing data values in the sample matrix to 0.
+        data = np.nan_to_num(data, nan=0)
+
+        # Weighted samples, so that the products are plain matrix products
+        # that run on BLAS also for large blocks of samples.
+        signed_weights = (sign * exp_weights)[:, None]
+        weighted_data = data * signed_weights
+        weighted_b_data = b_data * signed_weights
+        self.weighted_products *= decay_of_old_samples
+        self.weighted_products += weighted_data.T @ data
+        self.normalization *= decay_of_old_samples
+        self.normalization += weighted_b_data.T @ b_data
+        if self.b_remove_mean:
+            self.weighted_cross_products *= decay_of_old_samples
+            self.weighted_cross_products += weighted_b_data.T @ data
+            self.sum_of_samples += sign * data.sum(axis=0)
+            self.num_samples_per_feature += sign * np.count_nonzero(b_data, axis=0)
+
+
+class QuadraticUtilityUpdater:
+    """Incremental version of `compute_quadratic_utility` for daily rolls.
+
+    Receives the prices of the assets and the benchmark one date at a
+    time (or a few dates at a time) and keeps the EWMA sums of the cost
+    function in a `EWMACostFunctionUpdater`, so that rolling the window one
+    day costs O(n_assets**2). The prices inside the window are kept to
+    count the missing data of each ticker and to remove the oldest dates
+    from the sums.
+
+    After feeding it with the prices of the window `date_from:date_to`,
+    `compute()` returns the same triple as `compute_quadratic_utility`
+    up to rounding errors, except in the unusual case of a date whose
+    returns are missing for all the assets that pass the missing data
+    filter but not for all the tickers.
+
+    Parameters
+    ----------
+    tickers : list[str]
+        Names of the columns of the prices that will be given.
+    benchmark_column : str
+        The name of the column that corresponds to the benchmark to follow.
+    str_cost_function : str, {"covariance", "quadratic_distance"}
+        Cost function to compute.
+    EMWA_halflife : int, default=252
+        Half-life parameter for the exponential weighting, specified in trading days.
+    maximum_missing_data_ratio_allowed : float, default=0.0
+        Maximum allowed ratio of missing data points to total observations.
+    l2_regularization : float, default=0.0
+        Norm-2 regularization strength to add to the diagonal elements of the
+        cost function matrix.
+    window_size : int, optional, default=None
+        Maximum number of dates in the window. If given, the oldest dates are
+        removed automatically when new ones are added.
+
+    """
+
+    def __init__(
+        self,
+        tickers,
+        benchmark_column,
+        str_cost_function,
+        EMWA_halflife=252,
+        maximum_missing_data_ratio_allowed=0.0,
+        l2_regularization=0.0,
+        window_size=None
+    ):
+        if str_cost_function not in ["covariance", "quadratic_distance"]:
+            raise ValueError(f"Cost function '{str_cost_function}' is not valid. Possible values are 'covariance' or 'quadratic_distance'.")
+        tickers = list(tickers)
+        if benchmark_column not in tickers:
+            raise ValueError(f"Benchmark column '{benchmark_column}' is not in the provided tickers.")
+        if maximum_missing_data_ratio_allowed > 1 or maximum_missing_data_ratio_allowed < 0:
+            raise ValueError(f"The maximum ratio of allowed missing data: {maximum_missing_data_ratio_allowed} is out of bounds [0,1].")
+        if window_size is not None and window_size < 1:
+            raise ValueError(f"The window size must be a positive number of dates. Got: {window_size}")
+
+        self.input_tickers = tickers
+        # Move benchmark column to the last position
+        self.ix_columns = np.array(
+            [i for i, ticker in enumerate(tickers) if ticker != benchmark_column]
+            + [tickers.index(benchmark_column)]
+        )
+        self.tickers = [tickers[i] for i in self.ix_columns]
+        self.benchmark_column = benchmark_column
+        self.str_cost_function = str_cost_function
+        self.EMWA_halflife = EMWA_halflife
+        self.maximum_missing_data_ratio_allowed = maximum_missing_data_ratio_allowed
+        self.l2_regularization = l2_regularization
+        self.window_size = window_size
+
+        num_columns = len(self.tickers)
+        b_remove_mean = str_cost_function == "covariance"
+        self.cost_function_updater = EWMACostFunctionUpdater(num_columns, EMWA_halflife, b_remove_mean)
+        # Prices in the window and, for the covariance, the return of each date
+        # that entered the sums (a NaN row if it did not).
+        self.np_prices = np.empty((0, num_columns))
+        self.np_data_points = np.empty((0, num_columns))
+        self.num_prices_per_ticker = np.zeros(num_columns, dtype=np.int64)
+
+    @property
+    def num_samples(self):
+        """Number of dates in the window."""
+        return self.np_prices.shape[0]
+
+    def update(self, prices):
+        """Add the prices of new dates, ordered from earliest to latest.
+
+        Parameters
+        ----------
+        prices : np.ndarray[(n_new_dates, n_tickers), dtype=np.double]
+            Prices of the new dates with the columns in the order of `tickers`.
+            The prices of a single date can be given as a vector.
+
+        """
+        prices = np.asarray(prices, dtype=np.double)
+        if prices.ndim == 1:
+            prices = prices[None, :]
+        if prices.ndim != 2 or prices.shape[1] != len(self.tickers):
+            raise ValueError(f"The prices must have {len(self.tickers)} columns. Got an array with shape {prices.shape}.")
+        prices = prices[:, self.ix_columns]
+
+        if self.str_cost_function == "covariance":
+            previous_prices = np.concatenate((self.np_prices[-1:], prices[:-1]), axis=0)
+            data_points = 100 * (prices[prices.shape[0] - previous_prices.shape[0]:] / previous_prices - 1)
+            if self.num_samples == 0:
+                # The first date of the window has no return.
+                data_points = np.concatenate((np.full((1, prices.shape[1]), np.nan), data_points), axis=0)
+            b_date_has_data = ~np.all(np.isnan(data_points), axis=1)
+            self.cost_function_updater.update(data_points[b_date_has_data])
+        elif self.str_cost_function == "quadratic_distance":
+            # The prices are divided by the latest price when computing the cost.
+            data_points = prices
+            self.cost_function_updater.update(data_points)
+
+        self.np_prices = np.concatenate((self.np_prices, prices), axis=0)
+        self.np_data_points = np.concatenate((self.np_data_points, data_points), axis=0)
+        self.num_prices_per_ticker += np.count_nonzero(~np.isnan(prices), axis=0)
+
+        if self.window_size is not None and self.num_samples > self.window_size:
+            self.remove_oldest(self.num_samples - self.window_size)
+        return self
+
+    def remove_oldest(self, num_dates):
+        """Remove the `num_dates` oldest dates from the window."""
+        if num_dates > self.num_samples:
+            raise ValueError(f"Cannot remove {num_dates} dates, there are only {self.num_samples} in the window.")
+        if num_dates <= 0:
+            return self
+        if self.str_cost_function == "covariance":
+            # The return of the new first date of the window also leaves the sums.
+            num_data_points = min(num_dates + 1, self.num_samples)
+        else:
+            num_data_points = num_dates
+        data_points = self.np_data_points[:num_data_points]
+        if self.str_cost_function == "covariance":
+            data_points = data_points[~np.all(np.isnan(data_points), axis=1)]
+        self.cost_function_updater.remove_oldest(data_points)
+
+        self.num_prices_per_ticker -= np.count_nonzero(~np.isnan(self.np_prices[:num_dates]), axis=0)
+        self.np_prices = self.np_prices[num_dates:]
+        self.np_data_points = self.np_data_points[num_dates:]
+        if self.str_cost_function == "covariance" and self.num_samples > 0:
+            self.np_data_points[0] = np.nan
+        return self
+
+    def compute(self):
+        """Cost function of the prices in the window.
+
+        Returns
+        -------
+        cost_matrix (numpy.ndarray): A square matrix with the cost function between assets, excluding the benchmark asset.
+
+        benchmark_cost_vector (numpy.ndarray): A vector containing the cost function of each asset with the benchmark asset.
+
+        tickers (list[str]): A list of asset tickers excluding the benchmark asset.
+
+        """
+        if self.num_samples == 0:
+            raise ValueError("There are no prices in the window.")
+        np_latest_prices = self.np_prices[-1]
+        ix_tickers_without_missing_data = _find_tickers_without_missing_data(
+            self.num_prices_per_ticker, self.num_samples, np_latest_prices,
+            self.str_cost_function, self.maximum_missing_data_ratio_allowed
+        )
+        np_cost_function = self.cost_function_updater.cost_function()
+        np_cost_function_without_nan = np_cost_function[np.ix_(ix_tickers_without_missing_data, ix_tickers_without_missing_data)]
+        if self.str_cost_function == "quadratic_distance":
+            np_latest_prices = np_latest_prices[ix_tickers_without_missing_data]
+            np_cost_function_without_nan /= np.outer(np_latest_prices, np_latest_prices)
+
+        cost_matrix, benchmark_cost_vector = _assemble_cost_function(
+            np_cost_function_without_nan, ix_tickers_without_missing_data,
+            len(self.tickers) - 1, self.l2_regularization
+        )
+        return cost_matrix, benchmark_cost_vector, self.tickers[:-1]
+
+    def get_state(self):
+        """Dictionary with the whole state of the updater. It only contains
+        numpy arrays, so it can be stored with `np.savez`."""
+        state = {
+            "tickers": np.array(self.input_tickers),
+            "benchmark_column": np.array(self.benchmark_column),
+            "str_cost_function": np.array(self.str_cost_function),
+            "EMWA_halflife": np.array(self.EMWA_halflife),
+            "maximum_missing_data_ratio_allowed": np.array(self.maximum_missing_data_ratio_allowed),
+            "l2_regularization": np.array(self.l2_regularization),
+            "window_size": np.array(-1 if self.window_size is None else self.window_size),
+            "np_prices": self.np_prices,
+            "np_data_points": self.np_data_points,
+        }
+        state |= {
+            "cost_function_updater." + key: value
+            for key, value in self.cost_function_updater.get_state().items()
+        }
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        """Build an updater from the dictionary returned by `get_state`."""
+        window_size = int(state["window_size"])
+        updater = cls(
+            tickers=[str(ticker) for ticker in state["tickers"]],
+            benchmark_column=str(state["benchmark_column"]),
+            str_cost_function=str(state["str_cost_function"]),
+            EMWA_halflife=state["EMWA_halflife"].item(),
+            maximum_missing_data_ratio_allowed=float(state["maximum_missing_data_ratio_allowed"]),
+            l2_regularization=float(state["l2_regularization"]),
+            window_size=None if window_size < 0 else window_size
+        )
+        updater.np_prices = np.array(state["np_prices"], dtype=np.double)
+        updater.np_data_points = np.array(state["np_data_points"], dtype=np.double)
+        updater.num_prices_per_ticker = np.count_nonzero(~np.isnan(updater.np_prices), axis=0)
+        updater.cost_function_updater = EWMACostFunctionUpdater.from_state({
+            key.removeprefix("cost_function_updater."): value
+            for key, value in state.items()
+            if key.startswith("cost_function_updater.")
+        })
+        return updater
+
+    def save(self, file):
+        """Store the state of the updater in a `.npz` file."""
+        np.savez(file, **self.get_state())
+
+    @classmethod
+    def load(cls, file):
+        """Load an updater stored with `save`."""
+        with np.load(file) as state:
+            return cls.from_state(dict(state))
+
+
+def _as_price_arrays(assets_index_prices):
+    """Dates, a reader of blocks of prices and tickers of prices given as a
+    pandas DataFrame, an Arrow table with the dates in the first column, or a
+    (dates, prices, tickers) triple of arrays.
+
+    The reader `read_prices(rows, ix_columns)` returns a double precision
+    matrix with the given rows, a slice or an array of indices, and columns.
+    Only the requested block is copied."""
+    if isinstance(assets_index_prices, (tuple, list)):
+        if len(assets_index_prices) != 3:
+            raise ValueError("The prices must be given as a (dates, prices, tickers) triple.")
+        dates, np_prices, tickers = assets_index_prices
+        dates = np.asarray(dates)
+        np_prices = np.asarray(np_prices)
+        tickers = list(tickers)
+        if np_prices.ndim != 2 or np_prices.shape != (dates.size, len(tickers)):
+            raise ValueError(f"The prices must be a matrix with one row per date and one column per ticker, ({dates.size}, {len(tickers)}). Got an array with shape {np_prices.shape}.")
+    elif hasattr(assets_index_prices, "column_names") and hasattr(assets_index_prices, "column"):
+        table = assets_index_prices
+        dates = table.column(0).to_numpy()
+        tickers = list(table.column_names[1:])
+
+        def read_prices(rows, ix_columns):
+            if isinstance(rows, slice):
+                ix_start, ix_stop, _ = rows.indices(dates.size)
+                num_rows = max(ix_stop - ix_start, 0)
+            else:
+                num_rows = len(rows)
+            np_block = np.empty((num_rows, len(ix_columns)))
+            for j, ix_column in enumerate(ix_columns):
+                column = table.column(ix_column + 1)
+                if isinstance(rows, slice):
+                    # Only the rows of the window are converted.
+                    np_block[:, j] = column.slice(ix_start, num_rows).to_numpy()
+                else:
+                    np_block[:, j] = column.to_numpy()[rows]
+            return np_block
+
+        return dates, read_prices, tickers
+    else:
+        dates = assets_index_prices.index.to_numpy()
+        tickers = list(assets_index_prices.columns)
+        # A view of the data when all the columns have the same type.
+        np_prices = assets_index_prices.to_numpy()
+
+    def read_prices(rows, ix_columns):
+        return np.asarray(np_prices[rows][:, ix_columns], dtype=np.double)
+
+    return dates, read_prices, tickers
+
+
+def _first_row_from(dates, date_from):
+    """Index of the first sorted date that is not before date_from."""
+    if date_from is None:
+        return 0
+    if dates.dtype.kind == "M":
+        date_from = np.datetime64(date_from)
+    return int(np.searchsorted(dates, date_from, side="left"))
+
+
+def _first_row_after(dates, date_to):
+    """Index of the first sorted date after date_to. As in pandas, a date with
+    a coarser resolution than the dates, e.g. "2024-07-18", includes all
+    the dates inside it."""
+    if date_to is None:
+        return dates.size
+    if dates.dtype.kind == "M":
+        date_to = np.datetime64(date_to)
+        unit, _ = np.datetime_data(date_to.dtype)
+        return int(np.searchsorted(dates, date_to + np.timedelta64(1, unit), side="left"))
+    return int(np.searchsorted(dates, date_to, side="right"))
+
+
+def _select_window(assets_index_prices, benchmark_column, date_from, date_to):
+    """Dates, prices and tickers between date_from and date_to, sorted by date
+    and with the benchmark as the last column."""
+    dates, read_prices, tickers = _as_price_arrays(assets_index_prices)
+    if benchmark_column not in tickers:
+        raise ValueError(f"Benchmark column '{benchmark_column}' is not in the provided DataFrame.")
+
+    # Move benchmark column to the last position
+    ix_columns = (
+        [i for i, ticker in enumerate(tickers) if ticker != benchmark_column]
+        + [tickers.index(benchmark_column)]
+    )
+    tickers = [tickers[i] for i in ix_columns]
+
+    # Make sure that the prices dataset is ordered from earliest (top row)
+    # to latest date (bottom row).
+    ix_sorted_rows = None
+    if dates.size > 1 and not np.all(dates[1:] >= dates[:-1]):
+        ix_sorted_rows = np.argsort(dates, kind="stable")
+        dates = dates[ix_sorted_rows]
+
+    ix_start = _first_row_from(dates, date_from)
+    ix_stop = max(_first_row_after(dates, date_to), ix_start)
+    if ix_sorted_rows is None:
+        rows = slice(ix_start, ix_stop)
+    else:
+        rows = ix_sorted_rows[ix_start:ix_stop]
+    return dates[ix_start:ix_stop], read_prices(rows, ix_columns), tickers
+
+
+def _prepare_data_points(
+    assets_index_prices, benchmark_column, str_cost_function,
+    date_from, date_to, maximum_missing_data_ratio_allowed
+):
+    """Select the window of prices, filter out the tickers with missing data and
+    transform the prices into the data points of the cost function.
+
+    Returns the data points, the indices of the tickers without missing data
+    and all the tickers, with the benchmark as the last one."""
+    if str_cost_function not in ["covariance", "quadratic_distance"]:
+        raise ValueError(f"Cost function '{str_cost_function}' is not valid. Possible values are 'covariance' or 'quadratic_distance'.")
+
+    _, np_prices, tickers = _select_window(assets_index_prices, benchmark_column, date_from, date_to)
+
+    # Filter out tickers with more than some percentage of missing data.
+    ix_tickers_without_missing_data = _find_tickers_without_missing_data(
+        np.count_nonzero(~np.isnan(np_prices), axis=0), np_prices.shape[0],
+        np_prices[-1], str_cost_function, maximum_missing_data_ratio_allowed
+    )
+    # Remove assets with missing data.
+    np_prices = np_prices[:, ix_tickers_without_missing_data]
+
+    # Prepare the data to compute either the covariance or the quadratic distance.
+    # The tickers with a missing latest price were removed for the quadratic distance.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if str_cost_function == "covariance":
+            data_points = 100 * (np_prices[1:] / np_prices[:-1] - 1)
+            data_points = data_points[~np.all(np.isnan(data_points), axis=1)]
+        elif str_cost_function == "quadratic_distance":
+            data_points = np_prices / np_prices[-1]
+
+    return data_points, ix_tickers_without_missing_data, tickers
+
+
+def _iterate_blocks_of_rows(prices, num_rows_per_block):
+    """Yield consecutive blocks of rows of an array, or the blocks of an
+    iterable of blocks, as double precision matrices."""
+    if hasattr(prices, "shape") and len(prices.shape) == 2:
+        for ix_row in range(0, prices.shape[0], num_rows_per_block):
+            yield np.asarray(prices[ix_row:ix_row + num_rows_per_block], dtype=np.double)
+    else:
+        for np_block in prices:
+            np_block = np.asarray(np_block, dtype=np.double)
+            if np_block.ndim != 2:
+                raise ValueError(f"The blocks of prices must be matrices. Got an array with shape {np_block.shape}.")
+            if np_block.shape[0] > 0:
+                yield np_block
+
+
+def _find_tickers_without_missing_data(
+    num_prices_per_ticker, num_samples, np_latest_prices,
+    str_cost_function, maximum_missing_data_ratio_allowed
+):
+    """Indices of the tickers with a ratio of missing prices low enough to
+    enter the cost function. For the quadratic distance, the tickers whose
+    latest price is missing are also removed."""
+    if maximum_missing_data_ratio_allowed > 1 or maximum_missing_data_ratio_allowed < 0:
+        raise ValueError(f"The maximum ratio of allowed missing data: {maximum_missing_data_ratio_allowed} is out of bounds [0,1].")
+    missing_data_ratio_per_ticket = 1 - np.asarray(num_prices_per_ticker) / num_samples
+    b_ticker_without_missing_data = missing_data_ratio_per_ticket <= maximum_missing_data_ratio_allowed
+    # Add to tickers without missing data any with the latest price removed.
+    if str_cost_function == "quadratic_distance":
+        b_ticker_without_missing_data &= ~np.isnan(np_latest_prices)
+    return np.where(b_ticker_without_missing_data)[0]
+
+
+def _assemble_cost_function(
+    np_cost_function_without_nan, ix_tickers_without_missing_data,
+    num_assets, l2_regularization
+):
+    """Expand the cost function of the assets without missing data to all the
+    assets plus the benchmark, the last one, and split it into the assets cost
+    matrix and the assets to benchmark cost vector."""
+    compact_quadratic_utility = _compact_cost_function(
+        np_cost_function_without_nan, ix_tickers_without_missing_data,
+        num_assets, l2_regularization, tickers=None
+    )
+    cost_matrix, benchmark_cost_vector, _ = compact_quadratic_utility.padded()
+    return cost_matrix, benchmark_cost_vector
+
+
+def _compact_cost_function(
+    np_cost_function_without_nan, ix_tickers_without_missing_data,
+    num_assets, l2_regularization, tickers
+):
+    """Split the cost function of the tickers without missing data, which may
+    include the benchmark as the last one, into a `CompactQuadraticUtility`."""
+    # Add L2 regularization to the cost function.
+    np_cost_function_without_nan.flat[::np_cost_function_without_nan.shape[0] + 1] += l2_regularization
+
+    b_benchmark_without_missing_data = (
+        ix_tickers_without_missing_data.size > 0
+        and ix_tickers_without_missing_data[-1] == num_assets
+    )
+    if b_benchmark_without_missing_data:
+        num_assets_without_missing_data = ix_tickers_without_missing_data.size - 1
+        benchmark_cost_vector = np_cost_function_without_nan[:-1, -1]
+    else:
+        num_assets_without_missing_data = ix_tickers_without_missing_data.size
+        benchmark_cost_vector = np.zeros(num_assets_without_missing_data)
+    cost_matrix = np_cost_function_without_nan[:num_assets_without_missing_data, :num_assets_without_missing_data]
+
+    return CompactQuadraticUtility(
+        cost_matrix, benchmark_cost_vector,
+        ix_tickers_without_missing_data[:num_assets_without_missing_data],
+        num_assets, tickers
+    )
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from .quadratic_utility import compute_quadratic_utility, _select_window
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+__all__ = ["QuadraticUtilityCache"]
+
+
+class QuadraticUtilityCache:
+    """On-disk cache of the results of `compute_quadratic_utility`.
+
+    The results are stored in a directory, one subdirectory per result, named
+    by a hash of the window of prices and of all the parameters that change
+    the result. The matrices are stored as `.npy` files and a cache hit maps
+    them in memory instead of recomputing the cost function, so the returned
+    arrays are read-only.
+
+    Several processes can share the same directory. Every result is written
+    in a temporary subdirectory that is renamed to its final name when it is
+    complete, so readers never see partial results and, if several writers
+    compute the same result, only the first one is kept.
+
+    When the total size of the cache exceeds `max_size`, or the number of
+    results exceeds `max_entries`, the least recently used results are removed.
+
+    Parameters
+    ----------
+    directory : str or os.PathLike
+        Directory of the cache. It is created if it does not exist.
+    max_size : int, default=1 GiB
+        Maximum number of bytes of the stored results.
+    max_entries : int, optional, default=None
+        Maximum number of stored results.
+
+    """
+
+    def __init__(self, directory, max_size=2**30, max_entries=None):
+        self.directory = os.fspath(directory)
+        self.max_size = max_size
+        self.max_entries = max_entries
+        os.makedirs(self.directory, exist_ok=True)
+
+    def compute_quadratic_utility(
+        self,
+        assets_index_prices : pd.DataFrame,
+        benchmark_column: str,
+        str_cost_function : str,
+        date_from : str | pd.Timestamp,
+        date_to : str | pd.Timestamp,
+        EMWA_halflife : int = 252,
+        maximum_missing_data_ratio_allowed : float = 0.0,
+        l2_regularization : float = 0.0,
+        engine : str = "einsum",
+        dtype : np.dtype = np.double,
+        executor = None
+    ):
+        """Same as `iq.tools.quadratic_utility.compute_quadratic_utility`, but
+        the result is read from the cache if it was already computed."""
+        window = _select_window(assets_index_prices, benchmark_column, date_from, date_to)
+        key = self.key(
+            window, benchmark_column, str_cost_function,
+            EMWA_halflife=EMWA_halflife,
+            maximum_missing_data_ratio_allowed=maximum_missing_data_ratio_allowed,
+            l2_regularization=l2_regularization,
+            engine=engine,
+            dtype=np.dtype(dtype).name
+        )
+        result = self.get(key)
+        if result is not None:
+            return result
+
+        # The window is already selected, so all its dates are used.
+        result = compute_quadratic_utility(
+            window, benchmark_column, str_cost_function, None, None,
+            EMWA_halflife=EMWA_halflife,
+            maximum_missing_data_ratio_allowed=maximum_missing_data_ratio_allowed,
+            l2_regularization=l2_regularization,
+            engine=engine,
+            dtype=dtype,
+            executor=executor
+        )
+        self.put(key, result)
+        return result
+
+    @staticmethod
+    def key(window, benchmark_column, str_cost_function, **parameters):
+        """Hash of a (dates, prices, tickers) window of prices, as selected by
+        `compute_quadratic_utility`, and of the parameters of the computation."""
+        dates, np_prices, tickers = window
+        hasher = hashlib.blake2b(digest_size=20)
+        hasher.update(json.dumps(
+            {
+                "benchmark_column": str(benchmark_column),
+                "str_cost_function": str_cost_function,
+                "tickers": [str(ticker) for ticker in tickers],
+                "shape": list(np_prices.shape),
+                "dates_dtype": dates.dtype.str,
+                "parameters": {name: repr(value) for name, value in sorted(parameters.items())},
+            },
+            sort_keys=True
+        ).encode())
+        if dates.dtype.kind in "biufcmM":
+            hasher.update(np.ascontiguousarray(dates).view(np.uint8))
+        else:
+            hasher.update("\n".join(str(date) for date in dates).encode())
+        hasher.update(np.ascontiguousarray(np_prices, dtype=np.double).view(np.uint8))
+        return hasher.hexdigest()
+
+    def get(self, key):
+        """Cached result for `key`, or None if it is not in the cache."""
+        path = os.path.join(self.directory, key)
+        try:
+            cost_matrix = np.load(os.path.join(path, "cost_matrix.npy"), mmap_mode="r")
+            benchmark_cost_vector = np.load(os.path.join(path, "benchmark_cost_vector.npy"), mmap_mode="r")
+            with open(os.path.join(path, "tickers.json")) as file:
+                tickers = json.load(file)
+        except (FileNotFoundError, ValueError):
+            # Missing, or removed by another process while reading it.
+            return None
+        try:
+            # Mark the result as recently used.
+            os.utime(path)
+        except OSError:
+            pass
+        return cost_matrix, benchmark_cost_vector, tickers
+
+    def put(self, key, result):
+        """Store the result of `compute_quadratic_utility` under `key`."""
+        cost_matrix, benchmark_cost_vector, tickers = result
+        path = os.path.join(self.directory, key)
+        temporary_path = os.path.join(self.directory, f".tmp-{key}-{os.getpid()}-{uuid.uuid4().hex}")
+        os.makedirs(temporary_path)
+        try:
+            np.save(os.path.join(temporary_path, "cost_matrix.npy"), np.asarray(cost_matrix))
+            np.save(os.path.join(temporary_path, "benchmark_cost_vector.npy"), np.asarray(benchmark_cost_vector))
+            with open(os.path.join(temporary_path, "tickers.json"), "w") as file:
+                json.dump([str(ticker) for ticker in tickers], file)
+            try:
+                os.rename(temporary_path, path)
+            except OSError:
+                # Another writer stored the same result first.
+                pass
+        finally:
+            shutil.rmtree(temporary_path, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used results until the cache is within
+        its limits."""
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith(".tmp-"):
+                # Leftovers of writers that died more than a day ago.
+                if _modification_time(path) < time.time() - 24 * 3600:
+                    shutil.rmtree(path, ignore_errors=True)
+                continue
+            entries.append((_modification_time(path), _size_of_directory(path), path))
+        entries.sort()
+
+        total_size = sum(size for _, size, _ in entries)
+        num_entries = len(entries)
+        for _, size, path in entries:
+            b_too_large = total_size > self.max_size
+            b_too_many = self.max_entries is not None and num_entries > self.max_entries
+            if not (b_too_large or b_too_many):
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total_size -= size
+            num_entries -= 1
+
+    def clear(self):
+        """Remove all the results of the cache."""
+        for name in os.listdir(self.directory):
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+
+def _modification_time(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return 0.0
+
+
+def _size_of_directory(path):
+    size = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            try:
+                size += os.stat(os.path.join(root, file)).st_size
+            except OSError:
+                pass
+    return size